@@ -1,11 +1,15 @@
 """Initial migration - create all tables.
 
+Secondary indexes are created separately in revision 002 so that data
+can be restored between the two revisions without index maintenance.
+
 Revision ID: 001
 Revises: 
 Create Date: 2026-02-14 17:00:00.000000
 
 """
-from typing import Sequence, Union
+import uuid
+from typing import Any, Sequence, Union
 
 from alembic import op
 import sqlalchemy as sa
@@ -17,6 +21,16 @@ down_revision: Union[str, None] = None
 branch_labels: Union[str, Sequence[str], None] = None
 depends_on: Union[str, Sequence[str], None] = None
 
+# Rows per INSERT when seeding data, so large seeds never sit in one statement
+SEED_BATCH_SIZE = 1000
+
+
+def _seed_rows(table: sa.sql.expression.TableClause, rows: list[dict[str, Any]]) -> None:
+    """Insert seed rows in batches outside the migration transaction."""
+    with op.get_context().autocommit_block():
+        for start in range(0, len(rows), SEED_BATCH_SIZE):
+            op.bulk_insert(table, rows[start:start + SEED_BATCH_SIZE])
+
 
 def upgrade() -> None:
     """Create all tables and pgvector extension."""
@@ -31,8 +45,8 @@ def upgrade() -> None:
         sa.Column('hashed_password', sa.String(length=255), nullable=False),
         sa.Column('full_name', sa.String(length=255)),
         sa.Column('is_active', sa.Boolean(), default=True),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
         sa.PrimaryKeyConstraint('id')
     )
     op.create_index(op.f('ix_users_email'), 'users', ['email'], unique=True)
@@ -55,14 +69,11 @@ def upgrade() -> None:
         sa.Column('processing_completed_at', sa.DateTime()),
         sa.Column('error_message', sa.Text()),
         sa.Column('retry_count', sa.Integer(), default=0),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
         sa.ForeignKeyConstraint(['user_id'], ['users.id']),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_document_user_status', 'documents', ['user_id', 'status'])
-    op.create_index('idx_document_type', 'documents', ['document_type'])
-    op.create_index(op.f('ix_documents_created_at'), 'documents', ['created_at'])
     
     # Create financial_extractions table
     op.create_table(
@@ -81,14 +92,17 @@ def upgrade() -> None:
         sa.Column('total_amount', sa.Float()),
         sa.Column('currency', sa.String(length=10)),
         sa.Column('extraction_method', sa.String(length=50)),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
         sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_extraction_invoice_num', 'financial_extractions', ['invoice_number'])
-    op.create_index('idx_extraction_vendor', 'financial_extractions', ['vendor_name'])
-    op.create_index('idx_extraction_date', 'financial_extractions', ['invoice_date'])
+    
+    # Promote tax_rate out of the JSONB payload so it can be filtered via B-tree
+    op.execute(
+        "ALTER TABLE financial_extractions ADD COLUMN tax_rate DOUBLE PRECISION "
+        "GENERATED ALWAYS AS ((extracted_data->>'tax_rate')::double precision) STORED"
+    )
     
     # Create financial_validations table
     op.create_table(
@@ -101,12 +115,10 @@ def upgrade() -> None:
         sa.Column('actual_value', postgresql.JSONB(astext_type=sa.Text())),
         sa.Column('error_message', sa.Text()),
         sa.Column('severity', sa.String(length=50)),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
         sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_validation_type', 'financial_validations', ['validation_type'])
-    op.create_index('idx_validation_status', 'financial_validations', ['is_valid'])
     
     # Create risk_flags table
     op.create_table(
@@ -121,15 +133,11 @@ def upgrade() -> None:
         sa.Column('is_resolved', sa.Boolean(), default=False),
         sa.Column('resolved_at', sa.DateTime()),
         sa.Column('resolution_notes', sa.Text()),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
-        sa.Column('updated_at', sa.DateTime()),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.func.now()),
         sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_risk_level', 'risk_flags', ['risk_level'])
-    op.create_index('idx_risk_type', 'risk_flags', ['risk_type'])
-    op.create_index('idx_risk_resolved', 'risk_flags', ['is_resolved'])
-    op.create_index(op.f('ix_risk_flags_created_at'), 'risk_flags', ['created_at'])
     
     # Create document_chunks table with vector column
     op.create_table(
@@ -140,15 +148,15 @@ def upgrade() -> None:
         sa.Column('chunk_index', sa.Integer(), nullable=False),
         sa.Column('page_number', sa.Integer()),
         sa.Column('chunk_metadata', postgresql.JSONB(astext_type=sa.Text())),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
         sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
         sa.PrimaryKeyConstraint('id')
     )
     
     # Add vector column separately (pgvector)
     # Changed from 1536 to 768 to match Google Gemini embeddings
-    op.execute('ALTER TABLE document_chunks ADD COLUMN embedding vector(768)')
-    op.create_index('idx_chunk_document', 'document_chunks', ['document_id', 'chunk_index'])
+    # Stored as halfvec (FP16) to halve storage and distance-scan bandwidth
+    op.execute('ALTER TABLE document_chunks ADD COLUMN embedding halfvec(768)')
     
     # Create audit_logs table
     op.create_table(
@@ -163,27 +171,28 @@ def upgrade() -> None:
         sa.Column('changes', postgresql.JSONB(astext_type=sa.Text())),
         sa.Column('ip_address', sa.String(length=50)),
         sa.Column('user_agent', sa.String(length=500)),
-        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
         sa.ForeignKeyConstraint(['user_id'], ['users.id']),
         sa.ForeignKeyConstraint(['document_id'], ['documents.id']),
         sa.PrimaryKeyConstraint('id')
     )
-    op.create_index('idx_audit_action', 'audit_logs', ['action', 'created_at'])
-    op.create_index('idx_audit_resource', 'audit_logs', ['resource_type', 'resource_id'])
     
     # Insert demo user
-    op.execute("""
-        INSERT INTO users (id, email, hashed_password, full_name, is_active, created_at, updated_at)
-        VALUES (
-            '00000000-0000-0000-0000-000000000001',
-            'demo@finsight.ai',
-            '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5GyYzS6NkUgL.',
-            'Demo User',
-            true,
-            NOW(),
-            NOW()
-        )
-    """)
+    users_table = sa.table(
+        'users',
+        sa.column('id', postgresql.UUID(as_uuid=True)),
+        sa.column('email', sa.String),
+        sa.column('hashed_password', sa.String),
+        sa.column('full_name', sa.String),
+        sa.column('is_active', sa.Boolean),
+    )
+    _seed_rows(users_table, [{
+        'id': uuid.UUID('00000000-0000-0000-0000-000000000001'),
+        'email': 'demo@finsight.ai',
+        'hashed_password': '$2b$12$LQv3c1yqBWVHxkd0LHAkCOYz6TtxMQJqhN8/LewY5GyYzS6NkUgL.',
+        'full_name': 'Demo User',
+        'is_active': True,
+    }])
 
 
 def downgrade() -> None:
@@ -0,0 +1,104 @@
+"""Create secondary indexes.
+
+Kept apart from the initial migration so bulk restores can load data
+before any non-unique index exists:
+
+    alembic upgrade 001
+    (load data, e.g. with COPY)
+    alembic upgrade head
+
+Revision ID: 002
+Revises: 001
+Create Date: 2026-02-14 17:05:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '002'
+down_revision: Union[str, None] = '001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create all non-unique secondary indexes."""
+    # documents
+    op.create_index('idx_document_user_status', 'documents', ['user_id', 'status'])
+    op.create_index('idx_document_type', 'documents', ['document_type'])
+    op.create_index(op.f('ix_documents_created_at'), 'documents', ['created_at'])
+    
+    # financial_extractions
+    op.create_index('idx_extraction_invoice_num', 'financial_extractions', ['invoice_number'])
+    op.create_index('idx_extraction_vendor', 'financial_extractions', ['vendor_name'])
+    op.create_index('idx_extraction_date', 'financial_extractions', ['invoice_date'])
+    op.create_index('idx_extraction_tax_rate', 'financial_extractions', ['tax_rate'])
+    op.create_index(
+        'idx_extraction_data_gin', 'financial_extractions', ['extracted_data'],
+        postgresql_using='gin', postgresql_ops={'extracted_data': 'jsonb_path_ops'}
+    )
+    
+    # financial_validations
+    op.create_index('idx_validation_type', 'financial_validations', ['validation_type'])
+    op.create_index('idx_validation_status', 'financial_validations', ['is_valid'])
+    
+    # risk_flags
+    op.create_index('idx_risk_type', 'risk_flags', ['risk_type'])
+    op.create_index(
+        'idx_risk_dashboard', 'risk_flags',
+        ['is_resolved', 'risk_level', sa.text('created_at DESC')]
+    )
+    op.create_index(
+        'idx_risk_unresolved', 'risk_flags',
+        ['risk_level', sa.text('created_at DESC')],
+        postgresql_where=sa.text('is_resolved = false')
+    )
+    op.create_index(op.f('ix_risk_flags_created_at'), 'risk_flags', ['created_at'])
+    op.create_index(
+        'idx_risk_evidence_gin', 'risk_flags', ['evidence'],
+        postgresql_using='gin', postgresql_ops={'evidence': 'jsonb_path_ops'}
+    )
+    
+    # document_chunks
+    op.create_index('idx_chunk_document', 'document_chunks', ['document_id', 'chunk_index'])
+    
+    # audit_logs
+    op.create_index('idx_audit_action', 'audit_logs', ['action', 'created_at'])
+    op.create_index('idx_audit_resource', 'audit_logs', ['resource_type', 'resource_id'])
+    op.create_index(
+        'idx_audit_changes_gin', 'audit_logs', ['changes'],
+        postgresql_using='gin', postgresql_ops={'changes': 'jsonb_path_ops'}
+    )
+    
+    # ANN index for semantic search, built last so it is created over loaded data
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_hnsw ON document_chunks '
+        'USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64)'
+    )
+
+
+def downgrade() -> None:
+    """Drop all secondary indexes."""
+    op.execute('DROP INDEX IF EXISTS idx_chunk_embedding_hnsw')
+    op.drop_index('idx_audit_changes_gin', table_name='audit_logs')
+    op.drop_index('idx_audit_resource', table_name='audit_logs')
+    op.drop_index('idx_audit_action', table_name='audit_logs')
+    op.drop_index('idx_chunk_document', table_name='document_chunks')
+    op.drop_index('idx_risk_evidence_gin', table_name='risk_flags')
+    op.drop_index(op.f('ix_risk_flags_created_at'), table_name='risk_flags')
+    op.drop_index('idx_risk_unresolved', table_name='risk_flags')
+    op.drop_index('idx_risk_dashboard', table_name='risk_flags')
+    op.drop_index('idx_risk_type', table_name='risk_flags')
+    op.drop_index('idx_validation_status', table_name='financial_validations')
+    op.drop_index('idx_validation_type', table_name='financial_validations')
+    op.drop_index('idx_extraction_data_gin', table_name='financial_extractions')
+    op.drop_index('idx_extraction_tax_rate', table_name='financial_extractions')
+    op.drop_index('idx_extraction_date', table_name='financial_extractions')
+    op.drop_index('idx_extraction_vendor', table_name='financial_extractions')
+    op.drop_index('idx_extraction_invoice_num', table_name='financial_extractions')
+    op.drop_index(op.f('ix_documents_created_at'), table_name='documents')
+    op.drop_index('idx_document_type', table_name='documents')
+    op.drop_index('idx_document_user_status', table_name='documents')
@@ -0,0 +1,151 @@
+"""Partition audit_logs and document_chunks.
+
+audit_logs is range-partitioned by month on created_at so dashboard reads,
+vacuum and index maintenance touch only recent partitions. A DEFAULT
+partition catches rows outside the pre-created range; new monthly
+partitions can be attached ahead of time (or scheduled with pg_partman
+where the extension is available).
+
+document_chunks is hash-partitioned on document_id so per-document chunk
+lookups and deletes prune to a single partition and each partition
+carries its own, smaller HNSW graph.
+
+Revision ID: 003
+Revises: 002
+Create Date: 2026-02-14 17:10:00.000000
+
+"""
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '003'
+down_revision: Union[str, None] = '002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AUDIT_PARTITION_START = date(2026, 2, 1)
+AUDIT_PARTITION_MONTHS = 36
+CHUNK_PARTITIONS = 16
+
+
+def _month_bounds(start: date, months: int) -> list[tuple[date, date]]:
+    """Return consecutive [from, to) month ranges beginning at start."""
+    bounds = []
+    year, month = start.year, start.month
+    for _ in range(months):
+        lower = date(year, month, 1)
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        bounds.append((lower, date(year, month, 1)))
+    return bounds
+
+
+def _create_audit_logs(partitioned: bool) -> None:
+    """Create the audit_logs table, optionally range-partitioned by month."""
+    op.create_table(
+        'audit_logs',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('action', sa.String(length=100), nullable=False),
+        sa.Column('resource_type', sa.String(length=50), nullable=False),
+        sa.Column('resource_id', postgresql.UUID(as_uuid=True)),
+        sa.Column('description', sa.Text()),
+        sa.Column('changes', postgresql.JSONB(astext_type=sa.Text())),
+        sa.Column('ip_address', sa.String(length=50)),
+        sa.Column('user_agent', sa.String(length=500)),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id']),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id']),
+        sa.PrimaryKeyConstraint('id', 'created_at') if partitioned else sa.PrimaryKeyConstraint('id'),
+        **({'postgresql_partition_by': 'RANGE (created_at)'} if partitioned else {})
+    )
+    if partitioned:
+        for lower, upper in _month_bounds(AUDIT_PARTITION_START, AUDIT_PARTITION_MONTHS):
+            op.execute(
+                f"CREATE TABLE audit_logs_{lower:%Y_%m} PARTITION OF audit_logs "
+                f"FOR VALUES FROM ('{lower.isoformat()}') TO ('{upper.isoformat()}')"
+            )
+        op.execute('CREATE TABLE audit_logs_default PARTITION OF audit_logs DEFAULT')
+
+
+def _create_audit_logs_indexes() -> None:
+    op.create_index('idx_audit_action', 'audit_logs', ['action', 'created_at'])
+    op.create_index('idx_audit_resource', 'audit_logs', ['resource_type', 'resource_id'])
+    op.create_index(
+        'idx_audit_changes_gin', 'audit_logs', ['changes'],
+        postgresql_using='gin', postgresql_ops={'changes': 'jsonb_path_ops'}
+    )
+
+
+def _create_document_chunks(partitioned: bool) -> None:
+    """Create the document_chunks table, optionally hash-partitioned by document."""
+    op.create_table(
+        'document_chunks',
+        sa.Column('id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('document_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('chunk_text', sa.Text(), nullable=False),
+        sa.Column('chunk_index', sa.Integer(), nullable=False),
+        sa.Column('page_number', sa.Integer()),
+        sa.Column('chunk_metadata', postgresql.JSONB(astext_type=sa.Text())),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.func.now(), nullable=False),
+        sa.ForeignKeyConstraint(['document_id'], ['documents.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id', 'document_id') if partitioned else sa.PrimaryKeyConstraint('id'),
+        **({'postgresql_partition_by': 'HASH (document_id)'} if partitioned else {})
+    )
+    op.execute('ALTER TABLE document_chunks ADD COLUMN embedding halfvec(768)')
+    if partitioned:
+        for remainder in range(CHUNK_PARTITIONS):
+            op.execute(
+                f"CREATE TABLE document_chunks_p{remainder:02d} PARTITION OF document_chunks "
+                f"FOR VALUES WITH (MODULUS {CHUNK_PARTITIONS}, REMAINDER {remainder})"
+            )
+
+
+def _create_document_chunks_indexes() -> None:
+    op.create_index('idx_chunk_document', 'document_chunks', ['document_id', 'chunk_index'])
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_hnsw ON document_chunks '
+        'USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64)'
+    )
+
+
+def _rebuild(partitioned: bool) -> None:
+    """Recreate both tables in the requested layout, carrying data across."""
+    op.rename_table('audit_logs', 'audit_logs_old')
+    op.rename_table('document_chunks', 'document_chunks_old')
+    # Primary key index names are schema-wide, so move them out of the way too
+    op.execute('ALTER INDEX audit_logs_pkey RENAME TO audit_logs_old_pkey')
+    op.execute('ALTER INDEX document_chunks_pkey RENAME TO document_chunks_old_pkey')
+    
+    _create_audit_logs(partitioned)
+    _create_document_chunks(partitioned)
+    
+    op.execute('INSERT INTO audit_logs SELECT * FROM audit_logs_old')
+    op.execute(
+        'INSERT INTO document_chunks (id, document_id, chunk_text, chunk_index, page_number, '
+        'chunk_metadata, created_at, embedding) '
+        'SELECT id, document_id, chunk_text, chunk_index, page_number, '
+        'chunk_metadata, created_at, embedding FROM document_chunks_old'
+    )
+    
+    # Dropping the old tables frees their index names; build indexes after the load
+    op.drop_table('audit_logs_old')
+    op.drop_table('document_chunks_old')
+    
+    _create_audit_logs_indexes()
+    _create_document_chunks_indexes()
+
+
+def upgrade() -> None:
+    """Convert audit_logs and document_chunks to partitioned tables."""
+    _rebuild(partitioned=True)
+
+
+def downgrade() -> None:
+    """Convert audit_logs and document_chunks back to plain tables."""
+    _rebuild(partitioned=False)
@@ -0,0 +1,61 @@
+"""Optionally replace the HNSW chunk index with a pgvectorscale DiskANN index.
+
+Only applies when VECTOR_INDEX_TYPE=diskann. StreamingDiskANN with
+statistical binary quantization keeps a compressed graph in memory,
+roughly 8x smaller than a halfvec HNSW index, for a small recall cost.
+DiskANN indexes plain vectors, so the halfvec column is indexed through a
+vector(768) cast that the search query mirrors.
+
+Revision ID: 004
+Revises: 003
+Create Date: 2026-02-14 17:15:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from app.config import get_settings
+
+# revision identifiers, used by Alembic.
+revision: str = '004'
+down_revision: Union[str, None] = '003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _diskann_enabled() -> bool:
+    return get_settings().vector_index_type == "diskann"
+
+
+def upgrade() -> None:
+    """Build the DiskANN index when configured."""
+    if not _diskann_enabled():
+        return
+    
+    available = op.get_bind().execute(
+        sa.text("SELECT 1 FROM pg_available_extensions WHERE name = 'vectorscale'")
+    ).scalar()
+    if not available:
+        raise RuntimeError("VECTOR_INDEX_TYPE=diskann requires the pgvectorscale extension")
+    
+    op.execute('CREATE EXTENSION IF NOT EXISTS vectorscale CASCADE')
+    op.execute('DROP INDEX IF EXISTS idx_chunk_embedding_hnsw')
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_diskann ON document_chunks '
+        'USING diskann ((embedding::vector(768)) vector_ip_ops) '
+        "WITH (storage_layout = 'memory_optimized', num_neighbors = 50, num_bits_per_dimension = 2)"
+    )
+
+
+def downgrade() -> None:
+    """Restore the HNSW index."""
+    if not _diskann_enabled():
+        return
+    
+    op.execute('DROP INDEX IF EXISTS idx_chunk_embedding_diskann')
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_hnsw ON document_chunks '
+        'USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64)'
+    )
@@ -0,0 +1,36 @@
+"""Add indexes for document list pagination.
+
+Revision ID: 005
+Revises: 004
+Create Date: 2026-02-14 17:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '005'
+down_revision: Union[str, None] = '004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Create filter + newest-first indexes for list_documents."""
+    op.create_index(
+        'ix_documents_status_type_created', 'documents',
+        ['status', 'document_type', sa.text('created_at DESC')]
+    )
+    op.create_index(
+        'idx_document_failed', 'documents',
+        [sa.text('created_at DESC')],
+        postgresql_where=sa.text("status = 'FAILED'")
+    )
+
+
+def downgrade() -> None:
+    """Drop document list indexes."""
+    op.drop_index('idx_document_failed', table_name='documents')
+    op.drop_index('ix_documents_status_type_created', table_name='documents')
@@ -0,0 +1,34 @@
+"""Keep audit logs when their document is deleted.
+
+Revision ID: 006
+Revises: 005
+Create Date: 2026-02-14 17:25:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '006'
+down_revision: Union[str, None] = '005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Null out audit_logs.document_id on document delete."""
+    op.drop_constraint('audit_logs_document_id_fkey', 'audit_logs', type_='foreignkey')
+    op.create_foreign_key(
+        'audit_logs_document_id_fkey', 'audit_logs', 'documents',
+        ['document_id'], ['id'], ondelete='SET NULL'
+    )
+
+
+def downgrade() -> None:
+    """Restore the plain foreign key."""
+    op.drop_constraint('audit_logs_document_id_fkey', 'audit_logs', type_='foreignkey')
+    op.create_foreign_key(
+        'audit_logs_document_id_fkey', 'audit_logs', 'documents',
+        ['document_id'], ['id']
+    )
@@ -0,0 +1,53 @@
+"""Optionally index chunk embeddings by their binary quantization.
+
+Only applies when VECTOR_INDEX_TYPE=binary. The HNSW index is built over
+binary_quantize(embedding), one bit per dimension, so it is 16x smaller
+than the halfvec index and Hamming distance is cheap to compute. Search
+shortlists candidates through it and re-ranks them by the exact inner
+product on the stored halfvec embeddings.
+
+Revision ID: 007
+Revises: 006
+Create Date: 2026-02-14 17:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+from app.config import get_settings
+
+# revision identifiers, used by Alembic.
+revision: str = '007'
+down_revision: Union[str, None] = '006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _binary_enabled() -> bool:
+    return get_settings().vector_index_type == "binary"
+
+
+def upgrade() -> None:
+    """Replace the halfvec HNSW index with a binary-quantized one when configured."""
+    if not _binary_enabled():
+        return
+    
+    op.execute('DROP INDEX IF EXISTS idx_chunk_embedding_hnsw')
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_binary ON document_chunks '
+        'USING hnsw ((binary_quantize(embedding)::bit(768)) bit_hamming_ops) '
+        'WITH (m = 16, ef_construction = 64)'
+    )
+
+
+def downgrade() -> None:
+    """Restore the halfvec HNSW index."""
+    if not _binary_enabled():
+        return
+    
+    op.execute('DROP INDEX IF EXISTS idx_chunk_embedding_binary')
+    op.execute(
+        'CREATE INDEX idx_chunk_embedding_hnsw ON document_chunks '
+        'USING hnsw (embedding halfvec_ip_ops) WITH (m = 16, ef_construction = 64)'
+    )
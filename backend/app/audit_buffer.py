@@ -0,0 +1,110 @@
+"""Buffered audit log writer.
+
+Audit entries are held on the session until its transaction commits, then
+queued in-process and written by a background task in multi-row INSERTs.
+"""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import event, insert
+from sqlalchemy.orm import Session
+
+from app.database import AsyncSessionLocal
+from app.models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BATCH_SIZE = 500
+AUDIT_FLUSH_INTERVAL = 0.1  # seconds
+
+# Actions that are written in the caller's transaction instead of buffered
+SYNC_ACTIONS = frozenset({"DOCUMENT_DELETE"})
+
+_PENDING_KEY = "pending_audit_entries"
+_STOP = object()
+
+_queue: Optional[asyncio.Queue] = None
+_consumer: Optional[asyncio.Task] = None
+
+
+def is_running() -> bool:
+    """Whether the background writer is accepting entries."""
+    return _consumer is not None and not _consumer.done()
+
+
+def defer(session: Session, entry: dict[str, Any]) -> None:
+    """Hold an audit entry until the session's transaction commits."""
+    session.info.setdefault(_PENDING_KEY, []).append(entry)
+
+
+@event.listens_for(Session, "after_commit")
+def _enqueue_pending(session: Session) -> None:
+    entries = session.info.pop(_PENDING_KEY, None)
+    if entries and _queue is not None:
+        for entry in entries:
+            _queue.put_nowait(entry)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+
+async def _write(batch: list[dict[str, Any]]) -> None:
+    """Insert a batch of audit entries in one statement."""
+    try:
+        async with AsyncSessionLocal() as db:
+            await db.execute(insert(AuditLog), batch)
+            await db.commit()
+    except Exception:
+        logger.exception(f"Failed to write {len(batch)} audit log entries")
+
+
+async def _consume(queue: asyncio.Queue) -> None:
+    """Drain the queue, flushing every AUDIT_BATCH_SIZE entries or AUDIT_FLUSH_INTERVAL."""
+    loop = asyncio.get_running_loop()
+    stopping = False
+    
+    while not stopping:
+        item = await queue.get()
+        if item is _STOP:
+            break
+        
+        batch = [item]
+        deadline = loop.time() + AUDIT_FLUSH_INTERVAL
+        while len(batch) < AUDIT_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if item is _STOP:
+                stopping = True
+                break
+            batch.append(item)
+        
+        await _write(batch)
+
+
+def start() -> None:
+    """Start the background writer on the running event loop."""
+    global _queue, _consumer
+    if is_running():
+        return
+    _queue = asyncio.Queue()
+    _consumer = asyncio.create_task(_consume(_queue))
+
+
+async def stop() -> None:
+    """Flush buffered entries and stop the background writer."""
+    global _queue, _consumer
+    if _consumer is None:
+        return
+    _queue.put_nowait(_STOP)
+    await _consumer
+    _queue = None
+    _consumer = None
@@ -0,0 +1,72 @@
+"""Caches shared by read-heavy document endpoints and repeated LLM work."""
+
+from datetime import datetime
+from urllib.parse import urlparse
+from uuid import UUID
+
+from aiocache import Cache
+from aiocache.serializers import StringSerializer
+from fastapi import Response
+
+from app.config import get_settings
+
+settings = get_settings()
+
+# Entries are keyed by the document's updated_at, so edits never serve stale
+# data from here; the TTL only bounds memory held for old versions
+RESPONSE_CACHE_TTL = 3600
+
+# Kept short because clients and proxies cannot see document updates
+RESPONSE_MAX_AGE = 60
+
+# Risk explanations depend only on the flag, so they stay valid much longer
+EXPLANATION_CACHE_TTL = 7 * 24 * 3600
+
+# Search query embeddings; repeated and paginated searches reuse them
+QUERY_EMBEDDING_CACHE_TTL = 3600
+
+# Audit logs are append-only, so briefly stale pages are acceptable for
+# the frequently polled activity dashboard
+AUDIT_CACHE_TTL = 5
+
+
+def _build_cache(namespace: str, ttl: int) -> Cache:
+    """Use Redis when configured so all workers share hits, else process memory."""
+    if settings.redis_url:
+        url = urlparse(settings.redis_url)
+        return Cache(
+            Cache.REDIS,
+            endpoint=url.hostname or "localhost",
+            port=url.port or 6379,
+            db=int(url.path.lstrip("/") or 0),
+            password=url.password,
+            namespace=namespace,
+            serializer=StringSerializer(),
+            ttl=ttl,
+        )
+    return Cache(
+        Cache.MEMORY,
+        namespace=namespace,
+        serializer=StringSerializer(),
+        ttl=ttl,
+    )
+
+
+response_cache = _build_cache("responses", RESPONSE_CACHE_TTL)
+explanation_cache = _build_cache("explanations", EXPLANATION_CACHE_TTL)
+query_embedding_cache = _build_cache("query_embeddings", QUERY_EMBEDDING_CACHE_TTL)
+audit_cache = _build_cache("audit", AUDIT_CACHE_TTL)
+
+
+def document_cache_key(kind: str, document_id: UUID, updated_at: datetime, *parts: object) -> str:
+    """Build a cache key that changes whenever the document is updated."""
+    return ":".join([kind, str(document_id), updated_at.isoformat(), *map(str, parts)])
+
+
+def cached_json_response(payload: str, max_age: int = RESPONSE_MAX_AGE) -> Response:
+    """Return pre-serialized JSON with a short downstream cache lifetime."""
+    return Response(
+        content=payload,
+        media_type="application/json",
+        headers={"Cache-Control": f"max-age={max_age}"}
+    )
@@ -0,0 +1,23 @@
+"""Celery application for out-of-process document processing."""
+
+from celery import Celery
+
+from app.config import get_settings
+
+settings = get_settings()
+
+celery_app = Celery(
+    "finsight",
+    broker=settings.redis_url,
+    backend=settings.redis_url,
+    include=["app.tasks"],
+)
+
+celery_app.conf.update(
+    task_default_queue="documents",
+    task_routes={"app.tasks.process_document": {"queue": "documents"}},
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    worker_prefetch_multiplier=1,
+    task_track_started=True,
+)
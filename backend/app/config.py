@@ -1,5 +1,6 @@
+import json
 from functools import lru_cache
-from typing import Optional, Union, Any
+from typing import Literal, Optional, Union, Any
 from pydantic import field_validator
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
@@ -29,38 +30,58 @@ class Settings(BaseSettings):
     google_api_key: Optional[str] = None
     google_model: str = "gemini-3-flash-preview"
     embedding_model: str = "text-embedding-3-small"
+    # Risk explanations are short and templated, so they use a smaller model
+    explanation_openai_model: str = "gpt-4o-mini"
+    explanation_google_model: str = "gemini-2.0-flash-lite"
+    # Exact-match LLM response cache; shared via Redis when configured
+    llm_cache_enabled: bool = True
+    llm_cache_path: str = ".llm_cache.db"
+    
+    # Task queue (document processing runs in-process when unset)
+    redis_url: Optional[str] = None
     
     # File Storage
     upload_dir: str = "/app/uploads"
     max_upload_size_mb: int = 50
     
+    # Object storage for direct client uploads (local disk when bucket is unset);
+    # set the endpoint for MinIO or other S3-compatible stores
+    s3_bucket: Optional[str] = None
+    s3_endpoint_url: Optional[str] = None
+    s3_region: str = "us-east-1"
+    
     # Processing
     chunk_size: int = 1000
     chunk_overlap: int = 200
+    # Chunks per embeddings request; requests for one document run in parallel
+    embedding_batch_size: int = 16
+    
+    # Vector index: "hnsw" (pgvector), "diskann" (requires pgvectorscale) or
+    # "binary" (HNSW over binary-quantized embeddings, re-ranked exactly)
+    vector_index_type: Literal["hnsw", "diskann", "binary"] = "hnsw"
     
     # Security
     secret_key: str
     algorithm: str = "HS256"
     access_token_expire_minutes: int = 30
     
-    # CORS - accepts comma-separated string or list
-    cors_origins: Union[str, list[str]] = "http://localhost:3000"
+    # CORS - accepts comma-separated string, JSON array or list; frozen to a tuple
+    cors_origins: Union[str, tuple[str, ...]] = "http://localhost:3000"
     
     @field_validator('cors_origins', mode='before')
     @classmethod
-    def parse_cors_origins(cls, v: Any) -> list[str]:
+    def parse_cors_origins(cls, v: Any) -> tuple[str, ...]:
         """Parse CORS origins from string or list."""
         if isinstance(v, str):
-            if v.startswith("[") and v.endswith("]"):
-                import json
+            if v[:1] == "[" and v[-1:] == "]":
                 try:
-                    return json.loads(v)
-                except Exception:
+                    return tuple(json.loads(v))
+                except ValueError:
                     pass
-            return [origin.strip() for origin in v.split(',')]
-        elif isinstance(v, list):
-            return v
-        return [str(v)]
+            return tuple(origin.strip() for origin in v.split(','))
+        elif isinstance(v, (list, tuple)):
+            return tuple(v)
+        return (str(v),)
     
     @property
     def max_upload_size_bytes(self) -> int:
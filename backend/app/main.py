@@ -1,14 +1,18 @@
 """Main FastAPI application."""
 
+import asyncio
 import logging
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, ORJSONResponse
 
+from app import audit_buffer
 from app.config import get_settings
+from app.database import engine, vector_index_present, warm_up_pool
 from app.routes import documents, search, alerts, reports, audit
+from app.services import get_document_processor, get_search_service
 
 # Configure logging
 logging.basicConfig(
@@ -24,8 +28,25 @@ settings = get_settings()
 async def lifespan(app: FastAPI):
     """Application lifespan events."""
     logger.info("Starting FinSight AI API")
+    await warm_up_pool()
+    # The migrations pick the embedding index from this setting when they run,
+    # so a later change here leaves search querying an index that isn't there
+    logger.info(f"Vector index type: {settings.vector_index_type}")
+    if not await vector_index_present(settings.vector_index_type):
+        logger.warning(
+            f"No {settings.vector_index_type} embedding index found; "
+            "re-run the migrations with the same VECTOR_INDEX_TYPE"
+        )
+    # Build the AI service clients now instead of on the first request; the
+    # processor is only needed here when no Celery worker handles processing
+    await asyncio.to_thread(get_search_service)
+    if not settings.redis_url:
+        await asyncio.to_thread(get_document_processor)
+    audit_buffer.start()
     yield
     logger.info("Shutting down FinSight AI API")
+    await audit_buffer.stop()
+    await engine.dispose()
 
 
 # Create FastAPI app
@@ -34,6 +55,7 @@ app = FastAPI(
     version=settings.app_version,
     description="Financial Document Intelligence Platform - Production API",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # Configure CORS
@@ -46,6 +68,19 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """Reject uploads whose declared Content-Length exceeds the limit before the body is read."""
+    if request.method == "POST" and request.url.path == "/documents/upload":
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.max_upload_size_bytes:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File too large. Maximum size is {settings.max_upload_size_mb}MB"}
+            )
+    return await call_next(request)
+
+
 # Include routers
 app.include_router(documents.router)
 app.include_router(search.router)
@@ -75,7 +110,7 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return {"status": "healthy", "db_pool": engine.pool.status()}
 
 
 # Global exception handler
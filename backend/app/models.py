@@ -1,18 +1,18 @@
 """Database models for FinSight AI."""
 
 import uuid
-from datetime import datetime
 from enum import Enum
 from typing import Optional
 
 from sqlalchemy import (
     Column, String, DateTime, Integer, Float, Boolean,
-    ForeignKey, Text, JSON, Index, CheckConstraint
+    ForeignKey, Text, JSON, Index, CheckConstraint, Computed, func, text
 )
 from sqlalchemy.dialects.postgresql import UUID, JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
+from uuid6 import uuid7
 
 Base = declarative_base()
 
@@ -54,8 +54,8 @@ class User(Base):
     hashed_password = Column(String(255), nullable=False)
     full_name = Column(String(255))
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     documents = relationship("Document", back_populates="user", cascade="all, delete-orphan")
@@ -66,7 +66,8 @@ class Document(Base):
     """Uploaded financial documents."""
     __tablename__ = "documents"
     
-    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    # Time-ordered ids append to the right edge of the primary key index
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid7)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     
     # File metadata
@@ -91,20 +92,36 @@ class Document(Base):
     retry_count = Column(Integer, default=0)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
-    user = relationship("User", back_populates="documents")
-    extractions = relationship("FinancialExtraction", back_populates="document", cascade="all, delete-orphan")
-    validations = relationship("FinancialValidation", back_populates="document", cascade="all, delete-orphan")
-    risk_flags = relationship("RiskFlag", back_populates="document", cascade="all, delete-orphan")
-    chunks = relationship("DocumentChunk", back_populates="document", cascade="all, delete-orphan")
-    audit_logs = relationship("AuditLog", back_populates="document")
+    # lazy="raise": every access must be eager-loaded explicitly; child rows are
+    # removed by the database's ON DELETE CASCADE rather than loaded for deletion
+    user = relationship("User", back_populates="documents", lazy="raise")
+    extractions = relationship(
+        "FinancialExtraction", back_populates="document", lazy="raise",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+    validations = relationship(
+        "FinancialValidation", back_populates="document", lazy="raise",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+    risk_flags = relationship(
+        "RiskFlag", back_populates="document", lazy="raise",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+    chunks = relationship(
+        "DocumentChunk", back_populates="document", lazy="raise",
+        cascade="all, delete-orphan", passive_deletes=True
+    )
+    audit_logs = relationship("AuditLog", back_populates="document", lazy="raise", passive_deletes=True)
     
     __table_args__ = (
         Index("idx_document_user_status", "user_id", "status"),
         Index("idx_document_type", "document_type"),
+        Index("ix_documents_status_type_created", "status", "document_type", text("created_at DESC")),
+        Index("idx_document_failed", text("created_at DESC"), postgresql_where=text("status = 'FAILED'")),
     )
 
 
@@ -113,7 +130,7 @@ class FinancialExtraction(Base):
     __tablename__ = "financial_extractions"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     
     # Extraction results
     extracted_data = Column(JSONB, nullable=False)
@@ -132,10 +149,13 @@ class FinancialExtraction(Base):
     total_amount = Column(Float)
     currency = Column(String(10), default="USD")
     
+    # Generated from extracted_data so JSONB lookups can use a B-tree index
+    tax_rate = Column(Float, Computed("(extracted_data->>'tax_rate')::double precision", persisted=True))
+    
     # Metadata
     extraction_method = Column(String(50))
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     document = relationship("Document", back_populates="extractions")
@@ -144,6 +164,13 @@ class FinancialExtraction(Base):
         Index("idx_extraction_invoice_num", "invoice_number"),
         Index("idx_extraction_vendor", "vendor_name"),
         Index("idx_extraction_date", "invoice_date"),
+        Index("idx_extraction_tax_rate", "tax_rate"),
+        Index(
+            "idx_extraction_data_gin",
+            "extracted_data",
+            postgresql_using="gin",
+            postgresql_ops={"extracted_data": "jsonb_path_ops"},
+        ),
     )
 
 
@@ -152,7 +179,7 @@ class FinancialValidation(Base):
     __tablename__ = "financial_validations"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     
     # Validation results
     validation_type = Column(String(100), nullable=False, index=True)
@@ -167,7 +194,7 @@ class FinancialValidation(Base):
     severity = Column(String(50))
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     document = relationship("Document", back_populates="validations")
@@ -183,7 +210,7 @@ class RiskFlag(Base):
     __tablename__ = "risk_flags"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     
     # Risk details
     risk_type = Column(String(100), nullable=False, index=True)
@@ -202,55 +229,77 @@ class RiskFlag(Base):
     resolution_notes = Column(Text)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
     
     # Relationships
     document = relationship("Document", back_populates="risk_flags")
     
     __table_args__ = (
-        Index("idx_risk_level", "risk_level"),
         Index("idx_risk_type", "risk_type"),
-        Index("idx_risk_resolved", "is_resolved"),
+        Index("idx_risk_dashboard", "is_resolved", "risk_level", text("created_at DESC")),
+        Index(
+            "idx_risk_unresolved",
+            "risk_level",
+            text("created_at DESC"),
+            postgresql_where=text("is_resolved = false"),
+        ),
+        Index(
+            "idx_risk_evidence_gin",
+            "evidence",
+            postgresql_using="gin",
+            postgresql_ops={"evidence": "jsonb_path_ops"},
+        ),
     )
 
 
 class DocumentChunk(Base):
-    """Text chunks for semantic search."""
+    """Text chunks for semantic search (hash-partitioned by document)."""
     __tablename__ = "document_chunks"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="CASCADE"), primary_key=True)
     
     # Chunk data
     chunk_text = Column(Text, nullable=False)
     chunk_index = Column(Integer, nullable=False)
     page_number = Column(Integer)
     
-    # Vector embedding (768 dimensions for Google text-embedding-004)
-    embedding = Column(Vector(768))
+    # Vector embedding (768 dimensions for Google text-embedding-004), stored as FP16
+    embedding = Column(HALFVEC(768))
     
     # Metadata
     chunk_metadata = Column(JSONB)
     
     # Timestamps
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
     
     # Relationships
     document = relationship("Document", back_populates="chunks")
     
     __table_args__ = (
         Index("idx_chunk_document", "document_id", "chunk_index"),
+        # Default embedding index; migrations 004/007 replace it when
+        # VECTOR_INDEX_TYPE is diskann or binary, and alembic/env.py keeps
+        # autogenerate from comparing it
+        Index(
+            "idx_chunk_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_with={"m": 16, "ef_construction": 64},
+            postgresql_ops={"embedding": "halfvec_ip_ops"},
+        ),
+        {"postgresql_partition_by": "HASH (document_id)"},
     )
 
 
 class AuditLog(Base):
-    """Audit trail for all financial operations."""
+    """Audit trail for all financial operations (range-partitioned by month)."""
     __tablename__ = "audit_logs"
     
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"))
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id", ondelete="SET NULL"))
     
     # Action details
     action = Column(String(100), nullable=False, index=True)
@@ -265,8 +314,8 @@ class AuditLog(Base):
     ip_address = Column(String(50))
     user_agent = Column(String(500))
     
-    # Timestamp
-    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+    # Timestamp (part of the primary key as the partition key)
+    created_at = Column(DateTime(timezone=True), server_default=func.now(), primary_key=True, index=True)
     
     # Relationships
     user = relationship("User", back_populates="audit_logs")
@@ -275,4 +324,11 @@ class AuditLog(Base):
     __table_args__ = (
         Index("idx_audit_action", "action", "created_at"),
         Index("idx_audit_resource", "resource_type", "resource_id"),
+        Index(
+            "idx_audit_changes_gin",
+            "changes",
+            postgresql_using="gin",
+            postgresql_ops={"changes": "jsonb_path_ops"},
+        ),
+        {"postgresql_partition_by": "RANGE (created_at)"},
     )
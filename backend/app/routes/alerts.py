@@ -1,14 +1,18 @@
 """API routes for alerts and risk management."""
 
 import uuid
+from datetime import datetime
 from typing import Optional
 
+import orjson
 from fastapi import APIRouter, Depends, HTTPException, Query
-from sqlalchemy import select, and_, func
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, update, and_, func, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import selectinload
 
 from app.database import get_db
-from app.models import RiskFlag, Document
+from app.models import Document, RiskFlag
 from app.schemas import AlertResponse, AlertsListResponse
 
 router = APIRouter(prefix="/alerts", tags=["alerts"])
@@ -20,17 +24,24 @@ async def list_alerts(
     page_size: int = Query(20, ge=1, le=100),
     risk_level: Optional[str] = None,
     is_resolved: Optional[bool] = None,
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[uuid.UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
     List all risk flags/alerts.
     
     - Supports filtering by risk level and resolution status
-    - Paginated results
+    - Paginated results; pass the returned next_cursor/next_cursor_id to
+      page by keyset instead of offset (total then counts remaining rows)
     - Ordered by creation date (newest first)
     """
-    # Build query with join to get document info
-    query = select(RiskFlag, Document).join(Document, RiskFlag.document_id == Document.id)
+    # Build query with batched eager load of document info; the window count
+    # returns the filtered total alongside each row
+    query = (
+        select(RiskFlag, func.count().over().label("total"))
+        .options(selectinload(RiskFlag.document))
+    )
     
     # Apply filters
     filters = []
@@ -39,32 +50,37 @@ async def list_alerts(
     if is_resolved is not None:
         filters.append(RiskFlag.is_resolved == is_resolved)
     
-    if filters:
-        query = query.where(and_(*filters))
+    if cursor is not None and cursor_id is not None:
+        filters.append(tuple_(RiskFlag.created_at, RiskFlag.id) < tuple_(cursor, cursor_id))
     
-    # Get total count
-    count_query = select(func.count()).select_from(RiskFlag)
     if filters:
-        count_query = count_query.where(and_(*filters))
-    
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
+        query = query.where(and_(*filters))
     
     # Apply pagination
-    offset = (page - 1) * page_size
-    query = query.order_by(RiskFlag.created_at.desc()).offset(offset).limit(page_size)
+    offset = 0 if cursor is not None and cursor_id is not None else (page - 1) * page_size
+    query = query.order_by(RiskFlag.created_at.desc(), RiskFlag.id.desc()).offset(offset).limit(page_size)
     
     # Execute query
     result = await db.execute(query)
     rows = result.all()
+    if rows:
+        total = rows[0].total
+    elif offset:
+        # Past the last page no row carries the window count, so count separately
+        count_query = select(func.count()).select_from(RiskFlag)
+        if filters:
+            count_query = count_query.where(and_(*filters))
+        total = (await db.execute(count_query)).scalar()
+    else:
+        total = 0
     
     # Format response
     alerts = []
-    for risk, document in rows:
+    for risk, _ in rows:
         alerts.append(AlertResponse(
             id=risk.id,
             document_id=risk.document_id,
-            document_filename=document.filename,
+            document_filename=risk.document.filename,
             risk_type=risk.risk_type,
             risk_level=risk.risk_level,
             description=risk.description,
@@ -72,9 +88,59 @@ async def list_alerts(
             is_resolved=risk.is_resolved
         ))
     
+    last = alerts[-1] if len(alerts) == page_size else None
+    
     return AlertsListResponse(
         alerts=alerts,
-        total=total
+        total=total,
+        next_cursor=last.created_at if last else None,
+        next_cursor_id=last.id if last else None
+    )
+
+
+@router.get("/{alert_id}/explanation/stream")
+async def stream_alert_explanation(
+    alert_id: uuid.UUID,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Stream an AI explanation for an alert as server-sent events.
+    
+    - Each event's data is a JSON-encoded text fragment
+    - A final "end" event marks completion
+    """
+    result = await db.execute(
+        select(RiskFlag, Document.document_type)
+        .join(Document, RiskFlag.document_id == Document.id)
+        .where(RiskFlag.id == alert_id)
+    )
+    row = result.one_or_none()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Alert not found")
+    
+    risk, document_type = row
+    
+    risk_flag = {
+        "risk_type": risk.risk_type,
+        "risk_level": risk.risk_level,
+        "description": risk.description,
+        "evidence": risk.evidence,
+    }
+    document_context = {"document_type": document_type}
+    
+    from app.services.risk_detector import get_risk_detector
+    detector = get_risk_detector()
+    
+    async def events():
+        async for fragment in detector.stream_ai_explanation(risk_flag, document_context):
+            yield b"data: " + orjson.dumps(fragment) + b"\n\n"
+        yield b"event: end\ndata: {}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"}
     )
 
 
@@ -108,10 +174,14 @@ async def resolve_alert(
     risk_flag.resolved_at = datetime.utcnow()
     risk_flag.resolution_notes = resolution_notes
     
-    await db.commit()
-    await db.refresh(risk_flag)
+    # Touch the parent document so cached reports keyed on updated_at are invalidated
+    await db.execute(
+        update(Document)
+        .where(Document.id == risk_flag.document_id)
+        .values(updated_at=func.now())
+    )
     
-    # Log audit entry
+    # Log audit entry in the same transaction as the update
     from app.utils import log_audit
     await log_audit(
         db,
@@ -120,8 +190,10 @@ async def resolve_alert(
         document_id=risk_flag.document_id,
         resource_id=risk_flag.id,
         description=f"Resolved risk flag: {risk_flag.risk_type}",
-        changes={"resolution_notes": resolution_notes}
+        changes={"resolution_notes": resolution_notes},
+        transactional=True
     )
     await db.commit()
+    await db.refresh(risk_flag)
     
     return {"message": "Alert resolved", "alert": risk_flag}
@@ -1,9 +1,14 @@
 """API routes for audit logs."""
 
+import uuid
+from datetime import datetime
+from typing import Optional
+
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy import select, func
+from sqlalchemy import select, func, text, tuple_
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import AUDIT_CACHE_TTL, audit_cache, cached_json_response
 from app.database import get_db
 from app.models import AuditLog
 from app.schemas import AuditLogListResponse
@@ -15,31 +20,64 @@ router = APIRouter(prefix="/audit", tags=["audit"])
 async def list_audit_logs(
     page: int = Query(1, ge=1),
     page_size: int = Query(20, ge=1, le=100),
+    cursor: Optional[datetime] = None,
+    cursor_id: Optional[uuid.UUID] = None,
     db: AsyncSession = Depends(get_db)
 ):
     """
     List all audit logs for tracking activity.
     
     - Provides a full history of system actions
-    - Paginated and sorted by newest first
+    - Paginated and sorted by newest first; pass the returned
+      next_cursor/next_cursor_id to page by keyset instead of offset
+    - Responses are cached for a few seconds
     """
+    cache_key = f"{page}:{page_size}:{cursor}:{cursor_id}"
+    cached = await audit_cache.get(cache_key)
+    if cached is not None:
+        return cached_json_response(cached, AUDIT_CACHE_TTL)
+    
     # Build query
-    query = select(AuditLog).order_by(AuditLog.created_at.desc())
+    query = select(AuditLog).order_by(AuditLog.created_at.desc(), AuditLog.id.desc())
+    if cursor is not None and cursor_id is not None:
+        query = query.where(tuple_(AuditLog.created_at, AuditLog.id) < tuple_(cursor, cursor_id))
     
-    # Get total count
-    count_query = select(func.count()).select_from(AuditLog)
-    total_result = await db.execute(count_query)
+    # Estimate total from planner statistics instead of scanning the table.
+    # audit_logs is a partitioned parent, which autovacuum never analyzes, so
+    # sum its partitions' estimates; a partition not yet analyzed has
+    # reltuples -1 and is skipped. Count only if none has been analyzed.
+    total_result = await db.execute(
+        text(
+            "SELECT SUM(c.reltuples)::bigint "
+            "FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+            "WHERE i.inhparent = CAST(:table AS regclass) AND c.reltuples >= 0"
+        ),
+        {"table": AuditLog.__table__.fullname}
+    )
     total = total_result.scalar()
+    if total is None:
+        count_query = select(func.count()).select_from(AuditLog)
+        total_result = await db.execute(count_query)
+        total = total_result.scalar()
     
     # Apply pagination
-    offset = (page - 1) * page_size
-    query = query.offset(offset).limit(page_size)
+    query = query.limit(page_size)
+    if cursor is None or cursor_id is None:
+        query = query.offset((page - 1) * page_size)
     
     # Execute query
     result = await db.execute(query)
     logs = result.scalars().all()
     
-    return AuditLogListResponse(
+    last = logs[-1] if len(logs) == page_size else None
+    
+    page_response = AuditLogListResponse(
         logs=logs,
-        total=total
+        total=total,
+        next_cursor=last.created_at if last else None,
+        next_cursor_id=last.id if last else None
     )
+    payload = page_response.model_dump_json()
+    await audit_cache.set(cache_key, payload)
+    
+    return cached_json_response(payload, AUDIT_CACHE_TTL)
@@ -4,35 +4,120 @@ import asyncio
 import os
 import uuid
 from datetime import datetime
-from typing import Optional
+from typing import Literal, Optional, Union
 from pathlib import Path
 
+import aiofiles
+from uuid6 import uuid7
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, BackgroundTasks, Query
 from sqlalchemy import select, func, and_
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import joinedload, raiseload
 
+from app import storage
+from app.cache import response_cache, document_cache_key, cached_json_response
 from app.database import get_db
 from app.config import get_settings
 from app.models import Document, DocumentStatus, FinancialExtraction, FinancialValidation, RiskFlag
 from app.schemas import (
     DocumentUploadResponse, DocumentResponse, DocumentListResponse,
-    DocumentDetailResponse, FinancialExtractionResponse,
+    UploadUrlRequest, UploadUrlResponse, DocumentRegisterRequest,
+    DocumentDetailResponse, DocumentSummaryDetailResponse, FinancialExtractionResponse,
     ValidationResponse, RiskFlagResponse
 )
-from app.services.processor import DocumentProcessor
+from app.services.processor import get_document_processor
 
 router = APIRouter(prefix="/documents", tags=["documents"])
 settings = get_settings()
 
+# Read uploads in 1 MiB chunks so memory use does not scale with file size
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+ALLOWED_EXTENSIONS = frozenset({".pdf", ".docx", ".doc", ".png", ".jpg", ".jpeg"})
+ALLOWED_EXTENSIONS_STR = ", ".join(sorted(ALLOWED_EXTENSIONS))
+
+# Columns returned by DocumentResponse; listing skips extracted_text and file_path
+LIST_COLUMNS = (
+    Document.id, Document.user_id, Document.filename, Document.original_filename,
+    Document.file_size, Document.mime_type, Document.status, Document.document_type,
+    Document.page_count, Document.processing_started_at, Document.processing_completed_at,
+    Document.error_message, Document.retry_count, Document.created_at, Document.updated_at,
+)
+
 
 async def process_document_background(document_id: uuid.UUID):
     """Background task to process document."""
     from app.database import AsyncSessionLocal
     
     async with AsyncSessionLocal() as db:
-        processor = DocumentProcessor()
-        await processor.process_document(db, document_id)
+        await get_document_processor().process_document(db, document_id)
+
+
+def enqueue_processing(background_tasks: BackgroundTasks, document_id: uuid.UUID):
+    """Hand a document to the Celery worker queue, or process in-process without a broker."""
+    if settings.redis_url:
+        from app.tasks import process_document
+        process_document.delay(str(document_id))
+    else:
+        background_tasks.add_task(process_document_background, document_id)
+
+
+def validate_extension(filename: str) -> str:
+    """Return the lower-cased file extension, rejecting unsupported types."""
+    file_ext = Path(filename).suffix.lower()
+    
+    if file_ext not in ALLOWED_EXTENSIONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"File type not supported. Allowed: {ALLOWED_EXTENSIONS_STR}"
+        )
+    return file_ext
+
+
+async def register_document(
+    db: AsyncSession,
+    background_tasks: BackgroundTasks,
+    *,
+    filename: str,
+    original_filename: str,
+    file_path: str,
+    file_size: int,
+    mime_type: Optional[str]
+) -> Document:
+    """Create the document record, log the upload and queue processing."""
+    from app.utils import DEMO_USER_ID, log_audit
+    
+    # Create database record (in production, the user comes from auth)
+    document = Document(
+        user_id=DEMO_USER_ID,
+        filename=filename,
+        original_filename=original_filename,
+        file_path=file_path,
+        file_size=file_size,
+        mime_type=mime_type,
+        status=DocumentStatus.UPLOADED.value,
+    )
+    
+    db.add(document)
+    # Flush to assign the document id; server defaults come back via RETURNING
+    await db.flush()
+    
+    # Log audit entry in the same transaction as the insert
+    await log_audit(
+        db,
+        action="DOCUMENT_UPLOAD",
+        resource_type="document",
+        document_id=document.id,
+        resource_id=document.id,
+        description=f"Uploaded financial document: {original_filename}",
+        transactional=True
+    )
+    await db.commit()
+
+    # Start background processing
+    enqueue_processing(background_tasks, document.id)
+    
+    return document
 
 
 @router.post("/upload", response_model=DocumentUploadResponse, status_code=201)
@@ -48,77 +133,114 @@ async def upload_document(
     - Processing happens asynchronously
     - Returns immediately with document ID and status
     """
-    # Validate file size
-    file_size = 0
-    content = await file.read()
-    file_size = len(content)
-    
-    if file_size > settings.max_upload_size_bytes:
-        raise HTTPException(
-            status_code=413,
-            detail=f"File too large. Maximum size is {settings.max_upload_size_mb}MB"
-        )
-    
-    if file_size == 0:
-        raise HTTPException(status_code=400, detail="Empty file")
-    
     # Validate file type
-    allowed_extensions = [".pdf", ".docx", ".doc", ".png", ".jpg", ".jpeg"]
-    file_ext = Path(file.filename).suffix.lower()
-    
-    if file_ext not in allowed_extensions:
-        raise HTTPException(
-            status_code=400,
-            detail=f"File type not supported. Allowed: {', '.join(allowed_extensions)}"
-        )
+    file_ext = validate_extension(file.filename)
     
     # Create upload directory if it doesn't exist
     upload_dir = Path(settings.upload_dir)
-    upload_dir.mkdir(parents=True, exist_ok=True)
+    await asyncio.to_thread(upload_dir.mkdir, parents=True, exist_ok=True)
     
     # Generate unique filename
-    file_id = uuid.uuid4()
+    file_id = uuid7()
     safe_filename = f"{file_id}{file_ext}"
     file_path = upload_dir / safe_filename
     
-    # Save file
-    with open(file_path, "wb") as f:
-        f.write(content)
+    # Stream file to disk in chunks, enforcing the size limit as we go
+    file_size = 0
+    async with aiofiles.open(file_path, "wb") as f:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            file_size += len(chunk)
+            if file_size > settings.max_upload_size_bytes:
+                break
+            await f.write(chunk)
     
-    # For demo, use a hardcoded user_id (in production, get from auth)
-    demo_user_id = uuid.UUID("00000000-0000-0000-0000-000000000001")
+    if file_size > settings.max_upload_size_bytes:
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.max_upload_size_mb}MB"
+        )
     
-    # Create database record
-    document = Document(
-        user_id=demo_user_id,
+    if file_size == 0:
+        await asyncio.to_thread(file_path.unlink, missing_ok=True)
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    return await register_document(
+        db,
+        background_tasks,
         filename=safe_filename,
         original_filename=file.filename,
         file_path=str(file_path),
         file_size=file_size,
         mime_type=file.content_type,
-        status=DocumentStatus.UPLOADED.value,
     )
+
+
+@router.post("/upload-url", response_model=UploadUrlResponse)
+async def create_upload_url(request: UploadUrlRequest):
+    """
+    Get a presigned URL for uploading a document directly to object storage.
     
-    db.add(document)
-    await db.commit()
-    await db.refresh(document)
+    - PUT the file to the returned URL (with the same Content-Type, if given)
+    - Then call /documents/register with the returned key
+    - Only available when S3 storage is configured
+    """
+    if not storage.s3_enabled():
+        raise HTTPException(status_code=404, detail="Direct upload is not configured")
     
-    # Log audit entry
-    from app.utils import log_audit
-    await log_audit(
-        db,
-        action="DOCUMENT_UPLOAD",
-        resource_type="document",
-        document_id=document.id,
-        resource_id=document.id,
-        description=f"Uploaded financial document: {file.filename}"
-    )
-    await db.commit()
+    file_ext = validate_extension(request.filename)
+    key = f"{storage.S3_KEY_PREFIX}{uuid7()}{file_ext}"
+    url = await storage.generate_upload_url(key, request.content_type)
+    
+    return UploadUrlResponse(url=url, key=key, expires_in=storage.UPLOAD_URL_EXPIRY)
 
-    # Start background processing
-    background_tasks.add_task(process_document_background, document.id)
+
+@router.post("/register", response_model=DocumentUploadResponse, status_code=201)
+async def register_uploaded_document(
+    request: DocumentRegisterRequest,
+    background_tasks: BackgroundTasks,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Register a document uploaded via a presigned URL and start processing.
     
-    return document
+    - Verifies the object exists and is within the size limit
+    - Returns immediately with document ID and status
+    """
+    if not storage.s3_enabled():
+        raise HTTPException(status_code=404, detail="Direct upload is not configured")
+    
+    if not request.key.startswith(storage.S3_KEY_PREFIX):
+        raise HTTPException(status_code=400, detail="Invalid upload key")
+    validate_extension(request.key)
+    
+    head = await storage.head_object(request.key)
+    if head is None:
+        raise HTTPException(status_code=404, detail="Uploaded file not found")
+    
+    file_size = head["ContentLength"]
+    file_path = storage.s3_path(request.key)
+    
+    if file_size > settings.max_upload_size_bytes:
+        await storage.delete_file(file_path)
+        raise HTTPException(
+            status_code=413,
+            detail=f"File too large. Maximum size is {settings.max_upload_size_mb}MB"
+        )
+    
+    if file_size == 0:
+        await storage.delete_file(file_path)
+        raise HTTPException(status_code=400, detail="Empty file")
+    
+    return await register_document(
+        db,
+        background_tasks,
+        filename=Path(request.key).name,
+        original_filename=request.filename,
+        file_path=file_path,
+        file_size=file_size,
+        mime_type=head.get("ContentType"),
+    )
 
 
 @router.get("", response_model=DocumentListResponse)
@@ -135,8 +257,8 @@ async def list_documents(
     - Supports filtering by status and document type
     - Paginated results
     """
-    # Build query
-    query = select(Document)
+    # Build query; the window count returns the filtered total with each row
+    query = select(*LIST_COLUMNS, func.count().over().label("total"))
     
     # Apply filters
     filters = []
@@ -148,21 +270,25 @@ async def list_documents(
     if filters:
         query = query.where(and_(*filters))
     
-    # Get total count
-    count_query = select(func.count()).select_from(Document)
-    if filters:
-        count_query = count_query.where(and_(*filters))
-    
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    
     # Apply pagination
     offset = (page - 1) * page_size
     query = query.order_by(Document.created_at.desc()).offset(offset).limit(page_size)
     
     # Execute query
     result = await db.execute(query)
-    documents = result.scalars().all()
+    rows = result.all()
+    documents = [DocumentResponse.model_validate(row._mapping) for row in rows]
+    if len(rows) == page_size:
+        total = rows[0].total
+    elif rows or not offset:
+        # A short page is the last one, so the total is known from it
+        total = offset + len(rows)
+    else:
+        # Past the last page no row carries the window count, so count separately
+        count_query = select(func.count()).select_from(Document)
+        if filters:
+            count_query = count_query.where(and_(*filters))
+        total = (await db.execute(count_query)).scalar()
     
     return DocumentListResponse(
         documents=documents,
@@ -172,9 +298,10 @@ async def list_documents(
     )
 
 
-@router.get("/{document_id}", response_model=DocumentDetailResponse)
+@router.get("/{document_id}", response_model=Union[DocumentDetailResponse, DocumentSummaryDetailResponse])
 async def get_document(
     document_id: uuid.UUID,
+    fields: Literal["full", "minimal"] = "full",
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -182,25 +309,72 @@ async def get_document(
     
     - Returns complete document data
     - Includes all related financial data
+    - fields=minimal returns only summary columns of related data
+    - Completed documents are cached until the document changes
     """
-    # Query with eager loading of relationships
+    # Look up the version first so repeat requests skip the full load
+    version_result = await db.execute(
+        select(Document.status, Document.updated_at).where(Document.id == document_id)
+    )
+    version = version_result.one_or_none()
+    
+    if not version:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    cache_key = None
+    if version.status == DocumentStatus.COMPLETED.value:
+        cache_key = document_cache_key("document", document_id, version.updated_at, fields)
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached_json_response(cached)
+    
+    if fields == "minimal":
+        loaders = [
+            joinedload(Document.extractions).load_only(
+                FinancialExtraction.id, FinancialExtraction.invoice_number,
+                FinancialExtraction.total_amount, FinancialExtraction.currency,
+                FinancialExtraction.created_at
+            ),
+            joinedload(Document.validations).load_only(
+                FinancialValidation.id, FinancialValidation.validation_type,
+                FinancialValidation.is_valid, FinancialValidation.severity
+            ),
+            joinedload(Document.risk_flags).load_only(
+                RiskFlag.id, RiskFlag.risk_type, RiskFlag.risk_level,
+                RiskFlag.is_resolved, RiskFlag.created_at
+            ),
+        ]
+    else:
+        loaders = [
+            joinedload(Document.extractions),
+            joinedload(Document.validations),
+            joinedload(Document.risk_flags),
+        ]
+    
+    # Single-row fetch: joined eager loading returns everything in one round-trip
     query = (
         select(Document)
-        .options(
-            selectinload(Document.extractions),
-            selectinload(Document.validations),
-            selectinload(Document.risk_flags)
-        )
+        .options(*loaders, raiseload("*"))
         .where(Document.id == document_id)
     )
     
     result = await db.execute(query)
-    document = result.scalar_one_or_none()
+    document = result.unique().scalar_one_or_none()
     
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
     
-    return document
+    if fields == "minimal":
+        detail = DocumentSummaryDetailResponse.model_validate(document)
+    else:
+        detail = DocumentDetailResponse.model_validate(document)
+    
+    if cache_key is None:
+        return detail
+    
+    payload = detail.model_dump_json()
+    await response_cache.set(cache_key, payload)
+    return cached_json_response(payload)
 
 
 @router.post("/{document_id}/retry", response_model=DocumentResponse)
@@ -233,10 +407,8 @@ async def retry_document_processing(
     # Reset status
     document.status = DocumentStatus.UPLOADED.value
     document.error_message = None
-    await db.commit()
-    await db.refresh(document)
     
-    # Log audit entry
+    # Log audit entry in the same transaction as the reset
     from app.utils import log_audit
     await log_audit(
         db,
@@ -244,12 +416,14 @@ async def retry_document_processing(
         resource_type="document",
         document_id=document.id,
         resource_id=document.id,
-        description=f"Retried AI synthesis for: {document.original_filename}"
+        description=f"Retried AI synthesis for: {document.original_filename}",
+        transactional=True
     )
     await db.commit()
+    await db.refresh(document)
     
     # Start background processing
-    background_tasks.add_task(process_document_background, document.id)
+    enqueue_processing(background_tasks, document.id)
     
     return document
 
@@ -275,37 +449,22 @@ async def delete_document(
         raise HTTPException(status_code=404, detail="Document not found")
     
     # Delete file
-    file_path = Path(document.file_path)
-    if file_path.exists():
-        file_path.unlink()
+    await storage.delete_file(document.file_path)
     
-    # Log audit entry before deletion
+    # Log audit entry in the same commit as the delete; the document_id
+    # foreign key is ON DELETE SET NULL, so the log survives the delete
     from app.utils import log_audit
     await log_audit(
         db,
         action="DOCUMENT_DELETE",
         resource_type="document",
+        document_id=document.id,
+        resource_id=document.id,
         description=f"Permanently deleted document: {document.original_filename}",
         changes={"filename": document.filename, "original_filename": document.original_filename}
     )
-    # We commit the log before deleting the document if we want to keep the log
-    # Note: the log has document_id, which might be a foreign key constraint issue if we delete the document
-    # However, AuditLog table has Column(UUID(as_uuid=True), ForeignKey("documents.id"))
-    # If it's a hard delete on document, we might lose the log document_id link.
-    # But often audit logs should persist.
-    
-    # Actually, let's set document_id to None in the log if we delete the document?
-    # Or just let the foreign key handle it (cascade vs set null).
-    # In models.py: document = relationship("Document", back_populates="audit_logs")
-    # No cascade delete on audit logs in models.py for AuditLog.
-    # So if there is a FK, we might get an error if we don't handle it.
-    
-    # Let's check models.py for AuditLog FK.
-    # document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
-    # So we should probably NOT link it if we are deleting the document, or use a soft delete.
-    
-    # For now, I'll log it without the document_id link to avoid FK issues.
-    # Actually, I'll just skip the document_id in the log call for DELETE.
+    # Insert the log row before the DELETE it references runs
+    await db.flush()
     
     # Delete database record
     await db.delete(document)
@@ -6,10 +6,11 @@ from datetime import datetime
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import selectinload, raiseload
 
+from app.cache import response_cache, document_cache_key, cached_json_response
 from app.database import get_db
-from app.models import Document
+from app.models import Document, DocumentStatus
 from app.schemas import ReportRequest, ReportResponse
 
 router = APIRouter(prefix="/reports", tags=["reports"])
@@ -26,15 +27,39 @@ async def generate_report(
     - Includes all extracted data, validations, and risk flags
     - Suitable for compliance and auditing purposes
     - Returns structured JSON that can be downloaded
+    - Reports for completed documents are cached until the document changes
     """
-    # Query with eager loading
+    # Look up the version first so repeat requests skip the full load
+    version_result = await db.execute(
+        select(Document.status, Document.updated_at).where(Document.id == request.document_id)
+    )
+    version = version_result.one_or_none()
+    
+    if not version:
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    cache_key = None
+    if version.status == DocumentStatus.COMPLETED.value:
+        cache_key = document_cache_key(
+            "report", request.document_id, version.updated_at,
+            int(request.include_extractions), int(request.include_validations), int(request.include_risks)
+        )
+        cached = await response_cache.get(cache_key)
+        if cached is not None:
+            return cached_json_response(cached)
+    
+    # Eager-load only the sections the report includes
+    loaders = []
+    if request.include_extractions:
+        loaders.append(selectinload(Document.extractions))
+    if request.include_validations:
+        loaders.append(selectinload(Document.validations))
+    if request.include_risks:
+        loaders.append(selectinload(Document.risk_flags))
+    
     query = (
         select(Document)
-        .options(
-            selectinload(Document.extractions),
-            selectinload(Document.validations),
-            selectinload(Document.risk_flags)
-        )
+        .options(*loaders, raiseload("*"))
         .where(Document.id == request.document_id)
     )
     
@@ -53,7 +78,12 @@ async def generate_report(
         generated_at=datetime.utcnow()
     )
     
-    return report
+    if cache_key is None:
+        return report
+    
+    payload = report.model_dump_json()
+    await response_cache.set(cache_key, payload)
+    return cached_json_response(payload)
 
 
 @router.get("/{document_id}", response_model=ReportResponse)
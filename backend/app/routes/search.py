@@ -8,7 +8,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.schemas import SearchRequest, SearchResponse, SearchResult
-from app.services.semantic_search import SemanticSearchService
+from app.services.semantic_search import get_search_service
 
 router = APIRouter(tags=["search"])
 
@@ -28,7 +28,7 @@ async def semantic_search(
         - "Show risky vendors"
         - "Bank statements with negative balances"
     """
-    search_service = SemanticSearchService()
+    search_service = get_search_service()
     
     try:
         results = await search_service.search(
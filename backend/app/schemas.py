@@ -4,7 +4,7 @@ from datetime import datetime
 from typing import Optional, Any
 from uuid import UUID
 
-from pydantic import BaseModel, Field, field_validator
+from pydantic import BaseModel, ConfigDict, Field, field_validator
 
 
 # User Schemas
@@ -25,7 +25,7 @@ class UserResponse(UserBase):
     is_active: bool
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Document Schemas
@@ -36,7 +36,26 @@ class DocumentUploadResponse(BaseModel):
     status: str
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
+
+
+class UploadUrlRequest(BaseModel):
+    """Request for a presigned direct-upload URL."""
+    filename: str
+    content_type: Optional[str] = None
+
+
+class UploadUrlResponse(BaseModel):
+    """Presigned URL the client PUTs the file to, and the object key to register."""
+    url: str
+    key: str
+    expires_in: int
+
+
+class DocumentRegisterRequest(BaseModel):
+    """Register a document that was uploaded directly to object storage."""
+    key: str
+    filename: str
 
 
 class DocumentResponse(BaseModel):
@@ -57,7 +76,7 @@ class DocumentResponse(BaseModel):
     created_at: datetime
     updated_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 class DocumentListResponse(BaseModel):
@@ -87,7 +106,7 @@ class FinancialExtractionResponse(BaseModel):
     extraction_method: Optional[str]
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Validation Schemas
@@ -103,7 +122,7 @@ class ValidationResponse(BaseModel):
     severity: Optional[str]
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Risk Flag Schemas
@@ -121,7 +140,7 @@ class RiskFlagResponse(BaseModel):
     resolution_notes: Optional[str]
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 # Complete Document Response
@@ -132,6 +151,46 @@ class DocumentDetailResponse(DocumentResponse):
     risk_flags: list[RiskFlagResponse] = []
 
 
+# Minimal detail schemas (summary columns only)
+class FinancialExtractionSummary(BaseModel):
+    """Headline fields of a financial extraction."""
+    id: UUID
+    invoice_number: Optional[str]
+    total_amount: Optional[float]
+    currency: Optional[str]
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class ValidationSummary(BaseModel):
+    """Outcome of a validation check."""
+    id: UUID
+    validation_type: str
+    is_valid: bool
+    severity: Optional[str]
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class RiskFlagSummary(BaseModel):
+    """Headline fields of a risk flag."""
+    id: UUID
+    risk_type: str
+    risk_level: str
+    is_resolved: bool
+    created_at: datetime
+    
+    model_config = ConfigDict(from_attributes=True)
+
+
+class DocumentSummaryDetailResponse(DocumentResponse):
+    """Document with summaries of related data."""
+    extractions: list[FinancialExtractionSummary] = []
+    validations: list[ValidationSummary] = []
+    risk_flags: list[RiskFlagSummary] = []
+
+
 # Search Schemas
 class SearchRequest(BaseModel):
     """Semantic search request."""
@@ -176,6 +235,8 @@ class AlertsListResponse(BaseModel):
     """List of alerts."""
     alerts: list[AlertResponse]
     total: int
+    next_cursor: Optional[datetime] = None
+    next_cursor_id: Optional[UUID] = None
 
 
 # Report Schemas
@@ -208,13 +269,15 @@ class AuditLogResponse(BaseModel):
     description: Optional[str] = None
     created_at: datetime
     
-    model_config = {"from_attributes": True}
+    model_config = ConfigDict(from_attributes=True)
 
 
 class AuditLogListResponse(BaseModel):
     """List of audit logs with pagination."""
     logs: list[AuditLogResponse]
     total: int
+    next_cursor: Optional[datetime] = None
+    next_cursor_id: Optional[UUID] = None
 
 
 # Error Schemas
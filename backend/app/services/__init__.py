@@ -3,9 +3,9 @@
 from app.services.extractor import DocumentExtractor
 from app.services.ai_extractor import AIExtractor
 from app.services.validator import FinancialValidator
-from app.services.risk_detector import RiskDetector
-from app.services.semantic_search import SemanticSearchService
-from app.services.processor import DocumentProcessor
+from app.services.risk_detector import RiskDetector, get_risk_detector
+from app.services.semantic_search import SemanticSearchService, get_search_service
+from app.services.processor import DocumentProcessor, get_document_processor
 
 __all__ = [
     "DocumentExtractor",
@@ -14,4 +14,7 @@ __all__ = [
     "RiskDetector",
     "SemanticSearchService",
     "DocumentProcessor",
+    "get_search_service",
+    "get_risk_detector",
+    "get_document_processor",
 ]
@@ -2,21 +2,75 @@
 
 import json
 import logging
-from typing import Optional, Any
+import re
+from functools import lru_cache, partial
+from typing import Annotated, Optional, Any, Literal, TypeVar
 from datetime import datetime
 
+import msgspec
+import tiktoken
+
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain.globals import set_llm_cache
 from langchain.prompts import ChatPromptTemplate
 from langchain.output_parsers import PydanticOutputParser
 from pydantic import BaseModel, Field
 
 from app.config import get_settings
 from app.models import DocumentType
+from app.services.llm_batcher import AsyncBatcher
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Extraction prompts include only the first LLM_TOKEN_LIMIT tokens of the
+# document text (CLASSIFY_TOKEN_LIMIT for classification)
+LLM_TOKEN_LIMIT = 4000
+CLASSIFY_TOKEN_LIMIT = 1000
+
+# Document text averages well under this many characters per token, so
+# only the first max_tokens * MAX_CHARS_PER_TOKEN characters are tokenized
+MAX_CHARS_PER_TOKEN = 6
+LLM_TEXT_LIMIT = LLM_TOKEN_LIMIT * MAX_CHARS_PER_TOKEN
+
+VALID_DOCUMENT_TYPES = frozenset(dt.value for dt in DocumentType)
+
+# UnifiedExtraction section holding the data for each extractable document type
+UNIFIED_SECTIONS = {
+    DocumentType.INVOICE.value: "invoice",
+    DocumentType.BANK_STATEMENT.value: "bank_statement",
+    DocumentType.PROFIT_LOSS.value: "financial_statement",
+    DocumentType.BALANCE_SHEET.value: "financial_statement",
+}
+
+@lru_cache
+def get_tokenizer() -> tiktoken.Encoding:
+    """Get the tokenizer for the configured model; loaded when the AIExtractor is built."""
+    try:
+        return tiktoken.encoding_for_model(settings.openai_model)
+    except KeyError:
+        # Unknown to this tiktoken release (or a Gemini model); close enough for budgeting
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def truncate_to_tokens(text: str, max_tokens: int = LLM_TOKEN_LIMIT) -> str:
+    """Truncate text to at most max_tokens tokens."""
+    # A token covers at least one character, so short text needs no encoding
+    if len(text) <= max_tokens:
+        return text
+    
+    head = text[:max_tokens * MAX_CHARS_PER_TOKEN]
+    tokenizer = get_tokenizer()
+    tokens = tokenizer.encode(head, disallowed_special=())
+    if len(tokens) <= max_tokens:
+        return head
+    return tokenizer.decode(tokens[:max_tokens])
+
+
+# Cached LLM responses expire after a week when stored in Redis
+LLM_CACHE_TTL = 7 * 24 * 3600
+
 
 # Extraction schemas for different document types
 class InvoiceExtraction(BaseModel):
@@ -73,11 +127,209 @@ class FinancialStatementExtraction(BaseModel):
     confidence: float = Field(default=0.0, ge=0.0, le=1.0)
 
 
+class UnifiedExtraction(BaseModel):
+    """Schema for classifying a document and extracting its data in one call."""
+    document_type: Literal[
+        "INVOICE", "BANK_STATEMENT", "PROFIT_LOSS", "BALANCE_SHEET",
+        "TAX_DOCUMENT", "FINANCIAL_CONTRACT", "UNKNOWN"
+    ] = Field(..., description="Document type")
+    invoice: Optional[InvoiceExtraction] = Field(None, description="Filled only for INVOICE")
+    bank_statement: Optional[BankStatementExtraction] = Field(None, description="Filled only for BANK_STATEMENT")
+    financial_statement: Optional[FinancialStatementExtraction] = Field(
+        None, description="Filled only for PROFIT_LOSS or BALANCE_SHEET"
+    )
+
+
+# msgspec mirrors of the schemas above; LLM responses are decoded with these,
+# which is much cheaper than pydantic validation. The pydantic models are only
+# used to generate the format instructions.
+Confidence = Annotated[float, msgspec.Meta(ge=0.0, le=1.0)]
+
+
+class InvoiceExtractionStruct(msgspec.Struct, kw_only=True):
+    """Decoding struct for InvoiceExtraction."""
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[str] = None
+    due_date: Optional[str] = None
+    vendor_name: Optional[str] = None
+    vendor_address: Optional[str] = None
+    vendor_tax_id: Optional[str] = None
+    customer_name: Optional[str] = None
+    customer_address: Optional[str] = None
+    line_items: list[dict[str, Any]] = msgspec.field(default_factory=list)
+    subtotal: Optional[float] = None
+    tax_amount: Optional[float] = None
+    tax_rate: Optional[float] = None
+    total_amount: Optional[float] = None
+    currency: str = "USD"
+    payment_terms: Optional[str] = None
+    notes: Optional[str] = None
+    confidence: Confidence = 0.0
+
+
+class BankStatementExtractionStruct(msgspec.Struct, kw_only=True):
+    """Decoding struct for BankStatementExtraction."""
+    account_number: Optional[str] = None
+    account_holder: Optional[str] = None
+    bank_name: Optional[str] = None
+    statement_period_start: Optional[str] = None
+    statement_period_end: Optional[str] = None
+    opening_balance: Optional[float] = None
+    closing_balance: Optional[float] = None
+    total_credits: Optional[float] = None
+    total_debits: Optional[float] = None
+    transactions: list[dict[str, Any]] = msgspec.field(default_factory=list)
+    currency: str = "USD"
+    confidence: Confidence = 0.0
+
+
+class FinancialStatementExtractionStruct(msgspec.Struct, kw_only=True):
+    """Decoding struct for FinancialStatementExtraction."""
+    statement_type: str
+    company_name: Optional[str] = None
+    period_start: Optional[str] = None
+    period_end: Optional[str] = None
+    revenue: Optional[float] = None
+    expenses: Optional[float] = None
+    net_income: Optional[float] = None
+    assets: Optional[float] = None
+    liabilities: Optional[float] = None
+    equity: Optional[float] = None
+    line_items: list[dict[str, Any]] = msgspec.field(default_factory=list)
+    currency: str = "USD"
+    confidence: Confidence = 0.0
+
+
+class UnifiedExtractionStruct(msgspec.Struct, kw_only=True):
+    """Decoding struct for UnifiedExtraction."""
+    document_type: Literal[
+        "INVOICE", "BANK_STATEMENT", "PROFIT_LOSS", "BALANCE_SHEET",
+        "TAX_DOCUMENT", "FINANCIAL_CONTRACT", "UNKNOWN"
+    ]
+    invoice: Optional[InvoiceExtractionStruct] = None
+    bank_statement: Optional[BankStatementExtractionStruct] = None
+    financial_statement: Optional[FinancialStatementExtractionStruct] = None
+
+
+StructT = TypeVar("StructT", bound=msgspec.Struct)
+
+# LLMs often wrap JSON in a markdown code fence
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
+
+def decode_llm_json(content: str, struct_type: type[StructT]) -> StructT:
+    """Decode an LLM JSON response, optionally code-fenced, into a struct."""
+    match = _JSON_FENCE_RE.search(content)
+    payload = match.group(1) if match else content.strip()
+    # Lax mode accepts numbers the model quoted as strings, as pydantic did
+    return msgspec.json.decode(payload, type=struct_type, strict=False)
+
+
+# Format instructions serialize the JSON schema, so generate them once
+INVOICE_FORMAT_INSTRUCTIONS = PydanticOutputParser(
+    pydantic_object=InvoiceExtraction
+).get_format_instructions()
+BANK_STATEMENT_FORMAT_INSTRUCTIONS = PydanticOutputParser(
+    pydantic_object=BankStatementExtraction
+).get_format_instructions()
+FINANCIAL_STATEMENT_FORMAT_INSTRUCTIONS = PydanticOutputParser(
+    pydantic_object=FinancialStatementExtraction
+).get_format_instructions()
+UNIFIED_FORMAT_INSTRUCTIONS = PydanticOutputParser(
+    pydantic_object=UnifiedExtraction
+).get_format_instructions()
+
+# Prompts are built once with the format instructions filled in, so the static
+# system prefix is byte-identical across calls and eligible for the providers'
+# automatic prompt-prefix caching; the variable document text always comes last
+UNIFIED_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a financial document parser.
+First classify the document into ONE of these types:
+- INVOICE
+- BANK_STATEMENT
+- PROFIT_LOSS
+- BALANCE_SHEET
+- TAX_DOCUMENT
+- FINANCIAL_CONTRACT
+- UNKNOWN
+
+Then extract its data into the matching section: "invoice" for INVOICE,
+"bank_statement" for BANK_STATEMENT, "financial_statement" for PROFIT_LOSS or
+BALANCE_SHEET. Leave the other sections null.
+Return ONLY valid JSON matching the schema. Do not hallucinate fields.
+If a field is not present, use null. Use ISO date format (YYYY-MM-DD).
+
+{format_instructions}"""),
+    ("user", "Classify and extract all financial data from this document:\n\n{text}")
+]).partial(format_instructions=UNIFIED_FORMAT_INSTRUCTIONS)
+
+INVOICE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a financial document parser specialized in invoices.
+Extract structured data from the invoice text with high accuracy.
+Return ONLY valid JSON matching the schema. Do not hallucinate fields.
+If a field is not present, use null. Use ISO date format (YYYY-MM-DD).
+
+{format_instructions}"""),
+    ("user", "Extract all financial data from this invoice:\n\n{text}")
+]).partial(format_instructions=INVOICE_FORMAT_INSTRUCTIONS)
+
+BANK_STATEMENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a financial document parser specialized in bank statements.
+Extract structured data with precision. Return ONLY valid JSON.
+
+{format_instructions}"""),
+    ("user", "Extract all data from this bank statement:\n\n{text}")
+]).partial(format_instructions=BANK_STATEMENT_FORMAT_INSTRUCTIONS)
+
+FINANCIAL_STATEMENT_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a financial document parser for corporate financial statements.
+Extract data accurately. Return ONLY valid JSON matching the schema.
+
+{format_instructions}"""),
+    ("user", "Extract financial data from this {statement_type}:\n\n{text}")
+]).partial(format_instructions=FINANCIAL_STATEMENT_FORMAT_INSTRUCTIONS)
+
+CLASSIFY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a document classifier for financial documents.
+Classify the document into ONE of these types:
+- INVOICE
+- BANK_STATEMENT
+- PROFIT_LOSS
+- BALANCE_SHEET
+- TAX_DOCUMENT
+- FINANCIAL_CONTRACT
+- UNKNOWN
+
+Return ONLY the type name, nothing else."""),
+    ("user", "Classify this financial document:\n\n{text}")
+])
+
+
+def configure_llm_cache() -> None:
+    """Reuse LLM responses for byte-identical prompts, e.g. re-uploads and retries."""
+    if not settings.llm_cache_enabled:
+        return
+    
+    if settings.redis_url:
+        from langchain.cache import RedisCache
+        from redis import Redis
+        set_llm_cache(RedisCache(redis_=Redis.from_url(settings.redis_url), ttl=LLM_CACHE_TTL))
+    else:
+        from langchain.cache import SQLiteCache
+        set_llm_cache(SQLiteCache(database_path=settings.llm_cache_path))
+
+
 class AIExtractor:
     """AI-powered financial data extractor."""
     
     def __init__(self):
         """Initialize AI extractor with LLM."""
+        configure_llm_cache()
+        
+        # tiktoken reads (and may download) its BPE file on first use; do it here,
+        # at startup off the event loop, not inside the first long document's prompt
+        get_tokenizer()
+        
         if settings.google_api_key:
             logger.info(f"Initializing Gemini LLM with model {settings.google_model}")
             self.llm = ChatGoogleGenerativeAI(
@@ -86,6 +338,8 @@ class AIExtractor:
                 google_api_key=settings.google_api_key,
                 convert_system_message_to_human=True,
             )
+            # Gemini replies are decoded the same way, fenced or not
+            self.json_llm = self.llm
         else:
             logger.info(f"Initializing OpenAI LLM with model {settings.openai_model}")
             self.llm = ChatOpenAI(
@@ -93,6 +347,62 @@ class AIExtractor:
                 temperature=0,
                 api_key=settings.openai_api_key,
             )
+            # Extraction replies use JSON mode, so they arrive as bare JSON objects
+            self.json_llm = ChatOpenAI(
+                model=settings.openai_model,
+                temperature=0,
+                api_key=settings.openai_api_key,
+                model_kwargs={"response_format": {"type": "json_object"}},
+            )
+        
+        # Concurrent documents share LLM round-trips through batching queues,
+        # one per response format
+        self.batcher = AsyncBatcher(self.llm)
+        self.json_batcher = (
+            self.batcher if self.json_llm is self.llm else AsyncBatcher(self.json_llm)
+        )
+        
+        self._extractors = {
+            DocumentType.INVOICE.value: self._extract_invoice,
+            DocumentType.BANK_STATEMENT.value: self._extract_bank_statement,
+            DocumentType.PROFIT_LOSS.value: partial(
+                self._extract_financial_statement, statement_type=DocumentType.PROFIT_LOSS.value
+            ),
+            DocumentType.BALANCE_SHEET.value: partial(
+                self._extract_financial_statement, statement_type=DocumentType.BALANCE_SHEET.value
+            ),
+        }
+    
+    async def classify_and_extract(self, text: str) -> tuple[str, dict[str, Any], float]:
+        """
+        Classify a document and extract its financial data in a single LLM call.
+        
+        Args:
+            text: Extracted document text
+            
+        Returns:
+            Tuple of (document_type, extracted_data_dict, confidence_score)
+        
+        Raises:
+            ValueError: If the response cannot be parsed
+        """
+        prompt_value = await UNIFIED_PROMPT.ainvoke({"text": truncate_to_tokens(text)})
+        response = await self.json_batcher.submit(prompt_value)
+        
+        try:
+            result = decode_llm_json(response.content, UnifiedExtractionStruct)
+        except Exception as e:
+            raise ValueError(f"Failed to parse unified extraction: {str(e)}")
+        
+        section_name = UNIFIED_SECTIONS.get(result.document_type)
+        section = getattr(result, section_name) if section_name else None
+        
+        if section is None:
+            return result.document_type, {}, 0.0
+        
+        data = msgspec.structs.asdict(section)
+        confidence = data.pop("confidence", 0.8)
+        return result.document_type, data, confidence
     
     async def extract_financial_data(
         self,
@@ -109,45 +419,26 @@ class AIExtractor:
         Returns:
             Tuple of (extracted_data_dict, confidence_score)
         """
+        extractor = self._extractors.get(document_type)
+        if extractor is None:
+            logger.warning(f"Unsupported document type for extraction: {document_type}")
+            return {}, 0.0
+        
         try:
-            if document_type == DocumentType.INVOICE.value:
-                return await self._extract_invoice(text)
-            elif document_type == DocumentType.BANK_STATEMENT.value:
-                return await self._extract_bank_statement(text)
-            elif document_type in [DocumentType.PROFIT_LOSS.value, DocumentType.BALANCE_SHEET.value]:
-                return await self._extract_financial_statement(text, document_type)
-            else:
-                logger.warning(f"Unsupported document type for extraction: {document_type}")
-                return {}, 0.0
+            return await extractor(text)
         except Exception as e:
             logger.error(f"Error during AI extraction: {str(e)}")
             raise
     
     async def _extract_invoice(self, text: str) -> tuple[dict[str, Any], float]:
         """Extract invoice data."""
-        parser = PydanticOutputParser(pydantic_object=InvoiceExtraction)
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a financial document parser specialized in invoices.
-Extract structured data from the invoice text with high accuracy.
-Return ONLY valid JSON matching the schema. Do not hallucinate fields.
-If a field is not present, use null. Use ISO date format (YYYY-MM-DD).
-
-{format_instructions}"""),
-            ("user", "Extract all financial data from this invoice:\n\n{text}")
-        ])
-        
-        chain = prompt | self.llm
-        
-        response = await chain.ainvoke({
-            "text": text[:15000],
-            "format_instructions": parser.get_format_instructions()
-        })
+        prompt_value = await INVOICE_PROMPT.ainvoke({"text": truncate_to_tokens(text)})
+        response = await self.json_batcher.submit(prompt_value)
         
         # Parse the response
         try:
-            extracted = parser.parse(response.content)
-            data = extracted.model_dump()
+            extracted = decode_llm_json(response.content, InvoiceExtractionStruct)
+            data = msgspec.structs.asdict(extracted)
             confidence = data.pop("confidence", 0.8)
             return data, confidence
         except Exception as e:
@@ -156,26 +447,12 @@ If a field is not present, use null. Use ISO date format (YYYY-MM-DD).
     
     async def _extract_bank_statement(self, text: str) -> tuple[dict[str, Any], float]:
         """Extract bank statement data."""
-        parser = PydanticOutputParser(pydantic_object=BankStatementExtraction)
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a financial document parser specialized in bank statements.
-Extract structured data with precision. Return ONLY valid JSON.
-
-{format_instructions}"""),
-            ("user", "Extract all data from this bank statement:\n\n{text}")
-        ])
-        
-        chain = prompt | self.llm
-        
-        response = await chain.ainvoke({
-            "text": text[:15000],
-            "format_instructions": parser.get_format_instructions()
-        })
+        prompt_value = await BANK_STATEMENT_PROMPT.ainvoke({"text": truncate_to_tokens(text)})
+        response = await self.json_batcher.submit(prompt_value)
         
         try:
-            extracted = parser.parse(response.content)
-            data = extracted.model_dump()
+            extracted = decode_llm_json(response.content, BankStatementExtractionStruct)
+            data = msgspec.structs.asdict(extracted)
             confidence = data.pop("confidence", 0.8)
             return data, confidence
         except Exception as e:
@@ -188,27 +465,15 @@ Extract structured data with precision. Return ONLY valid JSON.
         statement_type: str
     ) -> tuple[dict[str, Any], float]:
         """Extract P&L or Balance Sheet data."""
-        parser = PydanticOutputParser(pydantic_object=FinancialStatementExtraction)
-        
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a financial document parser for corporate financial statements.
-Extract data accurately. Return ONLY valid JSON matching the schema.
-
-{format_instructions}"""),
-            ("user", "Extract financial data from this {statement_type}:\n\n{text}")
-        ])
-        
-        chain = prompt | self.llm
-        
-        response = await chain.ainvoke({
-            "text": text[:15000],
-            "statement_type": statement_type,
-            "format_instructions": parser.get_format_instructions()
+        prompt_value = await FINANCIAL_STATEMENT_PROMPT.ainvoke({
+            "text": truncate_to_tokens(text),
+            "statement_type": statement_type
         })
+        response = await self.json_batcher.submit(prompt_value)
         
         try:
-            extracted = parser.parse(response.content)
-            data = extracted.model_dump()
+            extracted = decode_llm_json(response.content, FinancialStatementExtractionStruct)
+            data = msgspec.structs.asdict(extracted)
             confidence = data.pop("confidence", 0.8)
             return data, confidence
         except Exception as e:
@@ -225,30 +490,15 @@ Extract data accurately. Return ONLY valid JSON matching the schema.
         Returns:
             DocumentType enum value
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a document classifier for financial documents.
-Classify the document into ONE of these types:
-- INVOICE
-- BANK_STATEMENT
-- PROFIT_LOSS
-- BALANCE_SHEET
-- TAX_DOCUMENT
-- FINANCIAL_CONTRACT
-- UNKNOWN
-
-Return ONLY the type name, nothing else."""),
-            ("user", "Classify this financial document:\n\n{text}")
-        ])
-        
-        chain = prompt | self.llm
-        
-        response = await chain.ainvoke({"text": text[:4000]})
+        prompt_value = await CLASSIFY_PROMPT.ainvoke({
+            "text": truncate_to_tokens(text, CLASSIFY_TOKEN_LIMIT)
+        })
+        response = await self.batcher.submit(prompt_value)
         
         doc_type = response.content.strip().upper()
         
         # Validate against known types
-        valid_types = [dt.value for dt in DocumentType]
-        if doc_type in valid_types:
+        if doc_type in VALID_DOCUMENT_TYPES:
             return doc_type
         
         return DocumentType.UNKNOWN.value
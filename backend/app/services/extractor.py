@@ -1,29 +1,140 @@
 """Document text extraction service."""
 
+import atexit
 import os
-from typing import Optional
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from typing import Callable, Iterator, Optional
 from pathlib import Path
 import logging
 
-from pypdf import PdfReader
+import pypdfium2 as pdfium
 from docx import Document as DocxDocument
 from PIL import Image
-import pytesseract
+import tesserocr
 
 logger = logging.getLogger(__name__)
 
+# PDFs with at least this many pages are split across worker processes;
+# PDFium is not thread-safe, so threads would serialize on _pdfium_lock
+PARALLEL_PDF_MIN_PAGES = 8
+PDF_WORKERS = min(4, os.cpu_count() or 1)
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+# Every PDFium call in a process must hold this lock
+_pdfium_lock = threading.Lock()
+
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    """Get the shared PDF extraction pool, creating it on first use."""
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # Spawn rather than fork: the parent runs threads (event loop, DB pool)
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+
+# Tesseract is in-process; one engine per process, reused across calls.
+# An engine instance is not thread-safe, so calls are serialized.
+OCR_MAX_DIMENSION = 3000
+# Pages without a text layer are rendered at 300 DPI for OCR
+OCR_RENDER_SCALE = 300 / 72
+
+_tess_api: Optional[tesserocr.PyTessBaseAPI] = None
+_tess_lock = threading.Lock()
+
+
+def _get_tess_api() -> tesserocr.PyTessBaseAPI:
+    """Get the process-wide Tesseract engine, loading it on first use (call under _tess_lock)."""
+    global _tess_api
+    if _tess_api is None:
+        _tess_api = tesserocr.PyTessBaseAPI(psm=tesserocr.PSM.AUTO)
+        atexit.register(_tess_api.End)
+    return _tess_api
+
+
+def _ocr_image(image: Image.Image) -> str:
+    """Run OCR on an image with the process-wide Tesseract engine."""
+    # OCR time scales with pixel count; very large scans gain nothing past this size
+    if max(image.size) > OCR_MAX_DIMENSION:
+        image.thumbnail((OCR_MAX_DIMENSION, OCR_MAX_DIMENSION))
+    
+    with _tess_lock:
+        api = _get_tess_api()
+        api.SetImage(image)
+        return api.GetUTF8Text()
+
+
+def _read_pdf_page(pdf: pdfium.PdfDocument, index: int) -> tuple[str, Optional[Image.Image]]:
+    """Read a page's text layer, rendering the page instead if it has none (call under _pdfium_lock)."""
+    page = pdf[index]
+    try:
+        textpage = page.get_textpage()
+        try:
+            text = textpage.get_text_range().replace("\r\n", "\n")
+        finally:
+            textpage.close()
+        
+        if text.strip():
+            return text, None
+        return "", page.render(scale=OCR_RENDER_SCALE, grayscale=True).to_pil()
+    finally:
+        page.close()
+
+
+def _iter_pdf_range(file_path: str, start: int, stop: Optional[int] = None) -> Iterator[str]:
+    """Yield the text of pages [start, stop), falling back to OCR for pages without a text layer."""
+    with _pdfium_lock:
+        pdf = pdfium.PdfDocument(file_path)
+    try:
+        if stop is None:
+            stop = len(pdf)
+        for index in range(start, stop):
+            # OCR runs outside the PDFium lock so other PDFs are not held up
+            with _pdfium_lock:
+                text, image = _read_pdf_page(pdf, index)
+            if image is not None:
+                logger.info(f"No text layer on page {index + 1}, running OCR")
+                text = _ocr_image(image)
+            yield text
+    finally:
+        with _pdfium_lock:
+            pdf.close()
+
+
+def _extract_pdf_pages(file_path: str, start: int, stop: int) -> list[str]:
+    """Extract the text of pages [start, stop) of a PDF; runs in a worker process."""
+    return list(_iter_pdf_range(file_path, start, stop))
+
 
 class DocumentExtractor:
     """Extract text from various document formats."""
     
     @staticmethod
-    def extract_text(file_path: str, mime_type: Optional[str] = None) -> tuple[str, int]:
+    def extract_text(
+        file_path: str,
+        mime_type: Optional[str] = None,
+        on_leading_text: Optional[Callable[[str], None]] = None,
+        leading_chars: int = 0
+    ) -> tuple[str, int]:
         """
         Extract text from document.
         
         Args:
             file_path: Path to document file
             mime_type: MIME type of file
+            on_leading_text: For PDFs, called once with the first leading_chars
+                characters of the text as soon as enough pages are read
+            leading_chars: Length of the text passed to on_leading_text
             
         Returns:
             Tuple of (extracted_text, page_count)
@@ -35,69 +146,136 @@ class DocumentExtractor:
         
         extension = file_path_obj.suffix.lower()
         
+        # The extension decides in the common case; the MIME type covers files without one
+        handler = EXTENSION_HANDLERS.get(extension)
+        if handler is None and mime_type:
+            handler = next(
+                (h for fragment, h in MIME_HANDLERS if fragment in mime_type), None
+            )
+        if handler is None:
+            logger.warning(f"Unsupported file type: {extension}")
+            return "", 0
+        
+        if on_leading_text is not None and handler is DocumentExtractor._extract_from_pdf:
+            handler = partial(
+                handler, on_leading_text=on_leading_text, leading_chars=leading_chars
+            )
+        
         try:
-            if extension == ".pdf" or (mime_type and "pdf" in mime_type):
-                return DocumentExtractor._extract_from_pdf(file_path)
-            elif extension in [".docx", ".doc"] or (mime_type and "word" in mime_type):
-                return DocumentExtractor._extract_from_docx(file_path)
-            elif extension in [".png", ".jpg", ".jpeg", ".tiff"] or (mime_type and "image" in mime_type):
-                return DocumentExtractor._extract_from_image(file_path)
-            else:
-                logger.warning(f"Unsupported file type: {extension}")
-                return "", 0
+            return handler(file_path)
         except Exception as e:
             logger.error(f"Error extracting text from {file_path}: {str(e)}")
             raise
     
     @staticmethod
-    def _extract_from_pdf(file_path: str) -> tuple[str, int]:
-        """Extract text from PDF."""
+    def _extract_from_pdf(
+        file_path: str,
+        on_leading_text: Optional[Callable[[str], None]] = None,
+        leading_chars: int = 0
+    ) -> tuple[str, int]:
+        """
+        Extract text from PDF.
+        
+        Each page is read and OCRed once; on_leading_text receives the start
+        of the text, identical to the returned text[:leading_chars], as soon
+        as the pages read so far cover it.
+        """
         text_parts = []
+        length = 0
         page_count = 0
         
         try:
-            with open(file_path, "rb") as file:
-                pdf_reader = PdfReader(file)
-                page_count = len(pdf_reader.pages)
-                
-                logger.info(f"PDF has {page_count} pages. Starting text extraction...")
-                
-                for page_num, page in enumerate(pdf_reader.pages, 1):
-                    page_text = page.extract_text()
-                    if page_text and page_text.strip():
-                        text_parts.append(f"\n--- Page {page_num} ---\n{page_text}")
-                    else:
-                        logger.warning(f"No selectable text found on page {page_num}")
+            with _pdfium_lock:
+                pdf = pdfium.PdfDocument(file_path)
+                page_count = len(pdf)
+                pdf.close()
+            
+            logger.info(f"PDF has {page_count} pages. Starting text extraction...")
+            
+            if page_count >= PARALLEL_PDF_MIN_PAGES and PDF_WORKERS > 1:
+                page_texts = DocumentExtractor._iter_pages_parallel(file_path, page_count)
+            else:
+                page_texts = _iter_pdf_range(file_path, 0, page_count)
+            
+            for page_num, page_text in enumerate(page_texts, 1):
+                if page_text and page_text.strip():
+                    text_parts.append(f"\n--- Page {page_num} ---\n{page_text}")
+                    length += len(text_parts[-1]) + 1
+                    # Read a little past the limit so trailing whitespace stripped
+                    # from the full text cannot fall inside it
+                    if on_leading_text is not None and length > leading_chars + 1000:
+                        on_leading_text("\n".join(text_parts).strip()[:leading_chars])
+                        on_leading_text = None
+                else:
+                    logger.warning(f"No text found on page {page_num}")
             
             full_text = "\n".join(text_parts).strip()
             
             if not full_text:
-                logger.warning(f"No selectable text extracted from the entire PDF: {file_path}")
-                # Future: Add OCR fallback here if pdf2image is available
+                logger.warning(f"No text extracted from the entire PDF: {file_path}")
             
             return full_text, page_count
         except Exception as e:
             logger.error(f"Failed to read PDF {file_path}: {str(e)}")
             raise ValueError(f"Could not read PDF file: {str(e)}")
     
+    @staticmethod
+    def _iter_pages_parallel(file_path: str, page_count: int) -> Iterator[str]:
+        """Yield page text in order, extracting contiguous page ranges across the worker pool."""
+        step = -(-page_count // PDF_WORKERS)
+        starts = range(0, page_count, step)
+        
+        try:
+            pool = _get_pdf_pool()
+            futures = [
+                pool.submit(_extract_pdf_pages, file_path, start, min(start + step, page_count))
+                for start in starts
+            ]
+        except (BrokenProcessPool, AssertionError, OSError) as e:
+            DocumentExtractor._reset_pdf_pool(e)
+            yield from _iter_pdf_range(file_path, 0, page_count)
+            return
+        
+        # Each range is yielded as soon as it and the ranges before it are done
+        try:
+            for start, future in zip(starts, futures):
+                try:
+                    page_texts = future.result()
+                except (BrokenProcessPool, AssertionError, OSError) as e:
+                    DocumentExtractor._reset_pdf_pool(e)
+                    yield from _iter_pdf_range(file_path, start, page_count)
+                    return
+                yield from page_texts
+        finally:
+            for future in futures:
+                future.cancel()
+    
+    @staticmethod
+    def _reset_pdf_pool(error: Exception) -> None:
+        """Drop a pool that cannot run (e.g. daemonic workers cannot start children)."""
+        global _pdf_pool
+        logger.warning(f"Parallel PDF extraction unavailable, extracting serially: {str(error)}")
+        with _pdf_pool_lock:
+            _pdf_pool = None
+    
     @staticmethod
     def _extract_from_docx(file_path: str) -> tuple[str, int]:
         """Extract text from DOCX."""
         doc = DocxDocument(file_path)
         
-        text_parts = []
-        for para in doc.paragraphs:
-            if para.text.strip():
-                text_parts.append(para.text)
+        # python-docx rebuilds .text from the XML runs on every access, so read it once
+        paragraphs = [text for para in doc.paragraphs if (text := para.text) and not text.isspace()]
         
         # Extract from tables
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = " | ".join(cell.text.strip() for cell in row.cells)
-                if row_text.strip():
-                    text_parts.append(row_text)
+        rows = [
+            row_text
+            for table in doc.tables
+            for row in table.rows
+            if (row_text := " | ".join([cell.text.strip() for cell in row.cells]))
+            and not row_text.isspace()
+        ]
         
-        full_text = "\n".join(text_parts)
+        full_text = "\n".join(paragraphs + rows)
         page_count = 1
         
         return full_text, page_count
@@ -107,8 +285,25 @@ class DocumentExtractor:
         """Extract text from image using OCR."""
         try:
             image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text, 1
+            return _ocr_image(image), 1
         except Exception as e:
             logger.error(f"OCR failed for {file_path}: {str(e)}")
             return "", 1
+
+
+# Text extraction handler per file extension, and per MIME type fragment as a fallback
+EXTENSION_HANDLERS = {
+    ".pdf": DocumentExtractor._extract_from_pdf,
+    ".docx": DocumentExtractor._extract_from_docx,
+    ".doc": DocumentExtractor._extract_from_docx,
+    ".png": DocumentExtractor._extract_from_image,
+    ".jpg": DocumentExtractor._extract_from_image,
+    ".jpeg": DocumentExtractor._extract_from_image,
+    ".tiff": DocumentExtractor._extract_from_image,
+}
+
+MIME_HANDLERS = (
+    ("pdf", DocumentExtractor._extract_from_pdf),
+    ("word", DocumentExtractor._extract_from_docx),
+    ("image", DocumentExtractor._extract_from_image),
+)
@@ -0,0 +1,80 @@
+"""Micro-batching of LLM calls across concurrently processed documents."""
+
+import asyncio
+import logging
+from typing import Any, Optional
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import BaseMessage
+from langchain_core.prompt_values import PromptValue
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncBatcher:
+    """
+    Collect LLM requests for a short window and send them in one abatch call.
+    
+    Callers await submit() as if it were a single ainvoke; requests arriving
+    within max_wait of each other share a batch of up to max_batch_size.
+    """
+    
+    def __init__(self, llm: BaseChatModel, max_batch_size: int = 32, max_wait: float = 0.05):
+        """Initialize batcher around a chat model."""
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue: Optional[asyncio.Queue] = None
+        self._collector: Optional[asyncio.Task] = None
+        self._in_flight: set[asyncio.Task] = set()
+    
+    async def submit(self, prompt: PromptValue) -> BaseMessage:
+        """Queue a prompt and wait for its response."""
+        self._ensure_collector()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((prompt, future))
+        return await future
+    
+    def _ensure_collector(self) -> None:
+        """Start the collector on the running loop if it is not already running."""
+        if self._collector is None or self._collector.done():
+            self._queue = asyncio.Queue()
+            self._collector = asyncio.create_task(self._collect())
+    
+    async def _collect(self) -> None:
+        """Group queued prompts into batches and dispatch each without waiting on it."""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            task = asyncio.create_task(self._dispatch(batch))
+            self._in_flight.add(task)
+            task.add_done_callback(self._in_flight.discard)
+    
+    async def _dispatch(self, batch: list[tuple[PromptValue, asyncio.Future]]) -> None:
+        """Send one batch and resolve each caller's future with its own result."""
+        prompts = [prompt for prompt, _ in batch]
+        try:
+            results: list[Any] = await self.llm.abatch(prompts, return_exceptions=True)
+        except Exception as e:
+            logger.error(f"LLM batch of {len(batch)} failed: {str(e)}")
+            results = [e] * len(batch)
+        
+        for (_, future), result in zip(batch, results):
+            if future.done():
+                # Caller was cancelled while waiting
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
@@ -3,25 +3,31 @@
 import asyncio
 import logging
 from datetime import datetime
+from functools import lru_cache
 from typing import Optional
 from uuid import UUID
 from pathlib import Path
 
-from sqlalchemy import select
+from sqlalchemy import insert, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app import storage
+from app.database import AsyncSessionLocal
 from app.models import (
     Document, DocumentStatus, DocumentType,
     FinancialExtraction, FinancialValidation, RiskFlag
 )
 from app.services.extractor import DocumentExtractor
-from app.services.ai_extractor import AIExtractor
+from app.services.ai_extractor import AIExtractor, LLM_TEXT_LIMIT
 from app.services.validator import FinancialValidator
-from app.services.risk_detector import RiskDetector
-from app.services.semantic_search import SemanticSearchService
+from app.services.risk_detector import get_risk_detector
+from app.services.semantic_search import get_search_service
 
 logger = logging.getLogger(__name__)
 
+# Cap on concurrent LLM calls per process
+LLM_CONCURRENCY = 8
+
 
 class DocumentProcessor:
     """
@@ -35,8 +41,9 @@ class DocumentProcessor:
         self.text_extractor = DocumentExtractor()
         self.ai_extractor = AIExtractor()
         self.validator = FinancialValidator()
-        self.risk_detector = RiskDetector()
-        self.search_service = SemanticSearchService()
+        self.risk_detector = get_risk_detector()
+        self.search_service = get_search_service()
+        self.llm_semaphore = asyncio.Semaphore(LLM_CONCURRENCY)
     
     async def process_document(
         self,
@@ -65,35 +72,50 @@ class DocumentProcessor:
             logger.error(f"Document {document_id} not found")
             return False
         
+        ai_task = None
+        store_task = None
         try:
             # Update status
             document.status = DocumentStatus.PROCESSING.value
             document.processing_started_at = datetime.utcnow()
             await db.commit()
             
-            # Step 1: Extract text
+            # Step 1: Extract text (for PDFs the AI steps start on the leading pages)
             logger.info(f"Step 1: Extracting text from {document.filename}")
-            extracted_text, page_count = await self._extract_text(document)
+            extracted_text, page_count, ai_task = await self._extract_text(document)
             
             if not extracted_text:
                 raise ValueError("Failed to extract text from document")
             
+            if ai_task is None:
+                ai_task = asyncio.create_task(self._classify_and_extract(extracted_text))
+            
             # Update document
             document.extracted_text = extracted_text
             document.page_count = page_count
             await db.commit()
             
-            # Step 2: Classify document type
-            logger.info("Step 2: Classifying document type")
-            document_type = await self._classify_document(extracted_text)
+            # Step 6: Embedding only needs the text, so it starts alongside the LLM
+            # steps below; chunks are inserted, on their own session, once the
+            # document type for their metadata is known, and committed only
+            # after the document's results are
+            logger.info("Step 6: Creating embeddings")
+            loop = asyncio.get_running_loop()
+            chunk_metadata = loop.create_future()
+            results_committed = loop.create_future()
+            store_task = asyncio.create_task(self._create_embeddings(
+                document.id, extracted_text, chunk_metadata, results_committed
+            ))
+            
+            # Steps 2-3: Classify document type and extract financial data with AI
+            logger.info("Steps 2-3: Classifying document and extracting financial data")
+            # Everything from here on is committed once at the end
+            document_type, extracted_data, confidence = await ai_task
             document.document_type = document_type
-            await db.commit()
-            
-            # Step 3: Extract financial data with AI
-            logger.info("Step 3: Extracting financial data")
-            extraction_record = await self._extract_financial_data(
-                db, document, extracted_text, document_type
+            chunk_metadata.set_result(
+                {"document_type": document.document_type, "filename": document.filename}
             )
+            extraction_record = await self._save_extraction(db, document, extracted_data, confidence)
             
             # Step 4: Validate extracted data
             logger.info("Step 4: Running validations")
@@ -107,15 +129,11 @@ class DocumentProcessor:
                 db, document, extraction_record, validation_records
             )
             
-            # Step 6: Create embeddings for semantic search
-            logger.info("Step 6: Creating embeddings")
-            await self._create_embeddings(db, document, extracted_text)
-            
             # Mark as completed
             document.status = DocumentStatus.COMPLETED.value
             document.processing_completed_at = datetime.utcnow()
             
-            # Log audit entry
+            # Log audit entry in the same transaction as the results
             from app.utils import log_audit
             await log_audit(
                 db,
@@ -123,64 +141,145 @@ class DocumentProcessor:
                 resource_type="document",
                 document_id=document.id,
                 resource_id=document.id,
-                description=f"AI synthesized {document.document_type}: {document.original_filename}"
+                description=f"AI synthesized {document.document_type}: {document.original_filename}",
+                transactional=True
             )
             
             await db.commit()
             
+            # Step 6 commits its chunks now that the document is complete
+            results_committed.set_result(None)
+            await store_task
+            
             logger.info(f"Successfully processed document {document_id}")
             return True
             
         except Exception as e:
             logger.error(f"Error processing document {document_id}: {str(e)}")
             
-            # Mark as failed
-            document.status = DocumentStatus.FAILED.value
-            document.error_message = str(e)
-            document.retry_count += 1
+            # Wait for the cancelled tasks so the embedding session is closed
+            # before the failure is recorded
+            tasks = [task for task in (ai_task, store_task) if task is not None]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            
+            # Mark as failed in a fresh transaction; the pipeline's may be aborted.
+            # Chunks are removed with it so a failed document is not searchable.
+            await db.rollback()
+            await self.search_service.delete_chunks_for_document(db, document_id)
+            await db.execute(
+                update(Document)
+                .where(Document.id == document_id)
+                .values(
+                    status=DocumentStatus.FAILED.value,
+                    error_message=str(e),
+                    retry_count=Document.retry_count + 1,
+                )
+            )
             await db.commit()
             
             return False
     
-    async def _extract_text(self, document: Document) -> tuple[str, int]:
-        """Extract text from document file."""
+    async def _extract_text(
+        self,
+        document: Document
+    ) -> tuple[str, int, Optional[asyncio.Task]]:
+        """
+        Extract text from document file.
+        
+        The AI steps only read the first LLM_TEXT_LIMIT characters (their token
+        budget is cut from those), so for PDFs the extractor hands those over
+        as soon as enough pages are parsed and the AI steps start while the
+        full text (stored and embedded) is still being extracted.
+        
+        Returns:
+            Tuple of (text, page_count, classify/extract task or None)
+        """
+        loop = asyncio.get_running_loop()
+        leading_text = loop.create_future()
+        
+        def publish_leading_text(text: str) -> None:
+            # Called from the extraction thread
+            loop.call_soon_threadsafe(lambda: leading_text.done() or leading_text.set_result(text))
+        
+        full_text_task = None
+        ai_task = None
         try:
-            text, page_count = self.text_extractor.extract_text(
-                document.file_path,
-                document.mime_type
-            )
-            return text, page_count
+            # Parsing/OCR is blocking; keep it off the event loop
+            async with storage.local_copy(document.file_path) as local_path:
+                full_text_task = asyncio.create_task(asyncio.to_thread(
+                    self.text_extractor.extract_text,
+                    local_path,
+                    document.mime_type,
+                    publish_leading_text,
+                    LLM_TEXT_LIMIT
+                ))
+                await asyncio.wait({full_text_task, leading_text}, return_when=asyncio.FIRST_COMPLETED)
+                if leading_text.done():
+                    ai_task = asyncio.create_task(self._classify_and_extract(leading_text.result()))
+                
+                text, page_count = await full_text_task
+            return text, page_count, ai_task
         except Exception as e:
             logger.error(f"Text extraction failed: {str(e)}")
+            for task in (full_text_task, ai_task):
+                if task is not None:
+                    task.cancel()
             raise
     
     async def _classify_document(self, text: str) -> str:
         """Classify document type using AI."""
         try:
-            doc_type = await self.ai_extractor.classify_document(text)
+            async with self.llm_semaphore:
+                doc_type = await self.ai_extractor.classify_document(text)
             return doc_type
         except Exception as e:
             logger.error(f"Document classification failed: {str(e)}")
             return DocumentType.UNKNOWN.value
     
-    async def _extract_financial_data(
+    async def _classify_and_extract(self, text: str) -> tuple[str, dict, float]:
+        """
+        Classify and extract financial data with AI; no database access.
+        
+        Uses one LLM call, falling back to separate classify and extract calls.
+        
+        Returns:
+            Tuple of (document_type, extracted_data, confidence)
+        """
+        try:
+            async with self.llm_semaphore:
+                return await self.ai_extractor.classify_and_extract(text)
+        except Exception as e:
+            logger.warning(f"Unified extraction failed, using separate calls: {str(e)}")
+        
+        document_type = await self._classify_document(text)
+        try:
+            async with self.llm_semaphore:
+                extracted_data, confidence = await self.ai_extractor.extract_financial_data(
+                    text, document_type
+                )
+        except Exception as e:
+            logger.error(f"Financial data extraction failed: {str(e)}")
+            extracted_data, confidence = {}, 0.0
+        
+        return document_type, extracted_data, confidence
+    
+    async def _save_extraction(
         self,
         db: AsyncSession,
         document: Document,
-        text: str,
-        document_type: str
+        extracted_data: dict,
+        confidence: float
     ) -> Optional[FinancialExtraction]:
-        """Extract financial data using AI."""
+        """Store extracted financial data as an extraction record."""
+        if not extracted_data:
+            logger.warning(f"No financial data extracted for document {document.id}")
+            return None
+        
         try:
-            extracted_data, confidence = await self.ai_extractor.extract_financial_data(
-                text, document_type
-            )
-            
-            if not extracted_data:
-                logger.warning(f"No financial data extracted for document {document.id}")
-                return None
-            
-            # Create extraction record
+            # Create extraction record; the savepoint keeps a failed insert
+            # from aborting the rest of the pipeline's transaction
             extraction = FinancialExtraction(
                 document_id=document.id,
                 extracted_data=extracted_data,
@@ -197,9 +296,8 @@ class DocumentProcessor:
                 extraction_method="AI_LANGCHAIN",
             )
             
-            db.add(extraction)
-            await db.commit()
-            await db.refresh(extraction)
+            async with db.begin_nested():
+                db.add(extraction)
             
             return extraction
             
@@ -218,30 +316,41 @@ class DocumentProcessor:
             return []
         
         try:
-            # Run validations based on document type
+            # Run validations based on document type; rule evaluation is
+            # synchronous, so keep it off the event loop
             if document.document_type == DocumentType.INVOICE.value:
-                validation_results = self.validator.validate_invoice(extraction.extracted_data)
+                validation_results = await asyncio.to_thread(
+                    self.validator.validate_invoice, extraction.extracted_data
+                )
             elif document.document_type == DocumentType.BANK_STATEMENT.value:
-                validation_results = self.validator.validate_bank_statement(extraction.extracted_data)
+                validation_results = await asyncio.to_thread(
+                    self.validator.validate_bank_statement, extraction.extracted_data
+                )
             else:
                 validation_results = []
             
-            # Store validation results
-            validation_records = []
-            for vr in validation_results:
-                validation = FinancialValidation(
-                    document_id=document.id,
-                    validation_type=vr.validation_type,
-                    is_valid=vr.is_valid,
-                    expected_value={"value": vr.expected_value} if vr.expected_value is not None else None,
-                    actual_value={"value": vr.actual_value} if vr.actual_value is not None else None,
-                    error_message=vr.error_message,
-                    severity=vr.severity,
-                )
-                db.add(validation)
-                validation_records.append(validation)
+            if not validation_results:
+                return []
             
-            await db.commit()
+            # Store validation results in one multi-row INSERT, in a savepoint
+            rows = [
+                {
+                    "document_id": document.id,
+                    "validation_type": vr.validation_type,
+                    "is_valid": vr.is_valid,
+                    "expected_value": {"value": vr.expected_value} if vr.expected_value is not None else None,
+                    "actual_value": {"value": vr.actual_value} if vr.actual_value is not None else None,
+                    "error_message": vr.error_message,
+                    "severity": vr.severity,
+                }
+                for vr in validation_results
+            ]
+            async with db.begin_nested():
+                result = await db.execute(
+                    insert(FinancialValidation).returning(FinancialValidation, sort_by_parameter_order=True),
+                    rows
+                )
+                validation_records = list(result.scalars())
             
             return validation_records
             
@@ -263,24 +372,12 @@ class DocumentProcessor:
         try:
             # Detect risks based on document type
             if document.document_type == DocumentType.INVOICE.value:
-                # Convert validation objects to simple objects for risk detector
-                validation_results = []
-                for v in validations:
-                    # Create a simple object with the needed attributes
-                    class SimpleValidation:
-                        def __init__(self, val):
-                            self.validation_type = val.validation_type
-                            self.is_valid = val.is_valid
-                            self.expected_value = val.expected_value
-                            self.actual_value = val.actual_value
-                            self.error_message = val.error_message
-                            self.severity = val.severity
-                    
-                    validation_results.append(SimpleValidation(v))
-                
-                risk_flags = self.risk_detector.detect_invoice_risks(
+                # The detector only reads loaded validation attributes, so the
+                # records can be passed as-is to a worker thread
+                risk_flags = await asyncio.to_thread(
+                    self.risk_detector.detect_invoice_risks,
                     extraction.extracted_data,
-                    validation_results
+                    validations
                 )
             else:
                 risk_flags = []
@@ -288,39 +385,38 @@ class DocumentProcessor:
             if not risk_flags:
                 return []
             
-            # Generate AI explanations concurrently for all risk flags
-            document_context = {
-                "document_type": document.document_type,
-                "extracted_data": extraction.extracted_data,
-            }
+            # Generate AI explanations for all risk flags in one batch
+            document_context = {"document_type": document.document_type}
             
-            explanation_tasks = [
-                self.risk_detector.generate_ai_explanation(rf, document_context)
-                for rf in risk_flags
-            ]
-            
-            explanations = await asyncio.gather(*explanation_tasks, return_exceptions=True)
+            # One document's batch takes one slot of the process-wide LLM limit
+            async with self.llm_semaphore:
+                explanations = await self.risk_detector.generate_ai_explanations(
+                    risk_flags, document_context
+                )
             
-            # Store risk flags with their explanations
-            risk_records = []
+            # Store risk flags with their explanations in one multi-row INSERT, in a savepoint
+            rows = []
             for rf, ai_explanation in zip(risk_flags, explanations):
                 # Handle any failed explanation gracefully
                 if isinstance(ai_explanation, Exception):
                     logger.warning(f"AI explanation failed for risk {rf['risk_type']}: {ai_explanation}")
                     ai_explanation = rf.get("description", "")
                 
-                risk = RiskFlag(
-                    document_id=document.id,
-                    risk_type=rf["risk_type"],
-                    risk_level=rf["risk_level"],
-                    description=rf["description"],
-                    ai_explanation=ai_explanation,
-                    evidence=rf.get("evidence"),
+                rows.append({
+                    "document_id": document.id,
+                    "risk_type": rf["risk_type"],
+                    "risk_level": rf["risk_level"],
+                    "description": rf["description"],
+                    "ai_explanation": ai_explanation,
+                    "evidence": rf.get("evidence"),
+                })
+            
+            async with db.begin_nested():
+                result = await db.execute(
+                    insert(RiskFlag).returning(RiskFlag, sort_by_parameter_order=True),
+                    rows
                 )
-                db.add(risk)
-                risk_records.append(risk)
-            
-            await db.commit()
+                risk_records = list(result.scalars())
             
             return risk_records
             
@@ -330,21 +426,26 @@ class DocumentProcessor:
     
     async def _create_embeddings(
         self,
-        db: AsyncSession,
-        document: Document,
-        text: str
+        document_id: UUID,
+        text: str,
+        metadata: asyncio.Future,
+        results_committed: asyncio.Future
     ) -> int:
-        """Create embeddings for semantic search."""
+        """
+        Embed the text for semantic search and store the chunks on a dedicated session.
+        
+        The chunks are committed only once results_committed resolves; if the
+        pipeline fails, this task is cancelled and they are rolled back.
+        """
         try:
-            metadata = {
-                "document_type": document.document_type,
-                "filename": document.filename,
-            }
-            
-            chunk_count = await self.search_service.create_chunks_and_embeddings(
-                db, document.id, text, metadata
-            )
+            async with AsyncSessionLocal() as db:
+                chunk_count = await self.search_service.embed_and_store_chunks(
+                    db, document_id, text, metadata
+                )
+                await results_committed
+                await db.commit()
             
+            logger.info(f"Stored {chunk_count} chunks for document {document_id}")
             return chunk_count
             
         except Exception as e:
@@ -358,6 +459,12 @@ class DocumentProcessor:
             return None
         
         try:
-            return datetime.fromisoformat(date_str.replace("Z", "+00:00"))
+            return datetime.fromisoformat(date_str)
         except (ValueError, TypeError):
             return None
+
+
+@lru_cache
+def get_document_processor() -> DocumentProcessor:
+    """Get the shared document processor instance."""
+    return DocumentProcessor()
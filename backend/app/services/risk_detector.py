@@ -1,20 +1,155 @@
 """Risk detection and AI explanation service."""
 
+import asyncio
+import hashlib
 import logging
-from typing import Any
+from functools import lru_cache
+from typing import Any, AsyncIterator, Callable, Optional, Union
 from datetime import datetime, timedelta
-from decimal import Decimal
 
+import orjson
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import ChatPromptTemplate
 
+from app.cache import explanation_cache
 from app.config import get_settings
-from app.models import RiskLevel
+from app.models import FinancialValidation, RiskLevel
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Rule thresholds, in the invoice's currency
+HIGH_VALUE_THRESHOLD = 10000.0
+CRITICAL_VALUE_THRESHOLD = 100000.0
+ROUND_NUMBER_MIN_AMOUNT = 1000.0
+MISSING_TAX_MIN_AMOUNT = 100.0
+
+# Most explanation calls one document has in flight at once
+EXPLANATION_CONCURRENCY = 10
+
+# Explanations are 2-3 sentences in one paragraph; output length drives latency
+EXPLANATION_MAX_TOKENS = 120
+EXPLANATION_STOP = ["\n\n"]
+
+# Risk level for a failed validation, by validation severity
+SEVERITY_TO_RISK_LEVEL = {
+    "ERROR": RiskLevel.HIGH.value,
+    "WARNING": RiskLevel.MEDIUM.value,
+}
+
+# Built once; only the flag details vary between calls
+EXPLANATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", """You are a financial auditor explaining risk flags to non-technical users.
+Explain clearly and professionally why the risk was flagged, referencing the evidence.
+Keep it concise (2-3 sentences)."""),
+    ("user", "Explain risk {risk_type}/{risk_level} on a {doc_type}: {description}. Evidence: {evidence}")
+])
+
+
+def _as_float(value: Any) -> Optional[float]:
+    """Read an extracted amount as a float for threshold checks, or None if it is not numeric."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def explanation_cache_key(risk_flag: dict[str, Any], doc_type: str) -> str:
+    """
+    Hash the parts of a risk flag an explanation is written from.
+    
+    These are the only inputs to the explanation prompt; flags of the same
+    type with the same evidence recur across documents.
+    """
+    payload = orjson.dumps(
+        [
+            risk_flag.get("risk_type"),
+            risk_flag.get("risk_level"),
+            risk_flag.get("description"),
+            risk_flag.get("evidence"),
+            doc_type,
+        ],
+        option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS,
+        default=str,
+    )
+    return hashlib.sha256(payload).hexdigest()
+
+
+def _explain_high_value(risk_flag: dict[str, Any]) -> str:
+    """Explain a HIGH_VALUE_TRANSACTION flag."""
+    evidence = risk_flag["evidence"]
+    return (
+        f"The invoice total of {evidence['currency']} {evidence['amount']:,.2f} is above the "
+        f"{evidence['currency']} {evidence['threshold']:,.0f} review threshold. High-value invoices "
+        "warrant confirming the order, its approval and the vendor's bank details before payment."
+    )
+
+
+def _explain_payment_terms(risk_flag: dict[str, Any]) -> str:
+    """Explain an UNUSUAL_PAYMENT_TERMS flag."""
+    evidence = risk_flag["evidence"]
+    days = evidence["payment_days"]
+    if days < 7:
+        return (
+            f"The invoice is due {days} days after it was issued, much sooner than the usual "
+            "30-day terms. Pressure to pay quickly is a common sign of invoice fraud, so confirm "
+            "the request with the vendor through a known contact before paying."
+        )
+    return (
+        f"The invoice allows {days} days for payment, well beyond the usual 30-90 days. "
+        "Terms this long are unusual and may reflect a non-standard arrangement worth "
+        "confirming with the vendor."
+    )
+
+
+def _explain_round_number(risk_flag: dict[str, Any]) -> str:
+    """Explain a ROUND_NUMBER_ANOMALY flag."""
+    return (
+        f"{risk_flag['description']}. Exact round totals are more typical of estimates than "
+        "itemized invoices, so check the amount against the underlying order or contract."
+    )
+
+
+def _explain_missing_tax(risk_flag: dict[str, Any]) -> str:
+    """Explain a MISSING_TAX_INFORMATION flag."""
+    if risk_flag["evidence"]["missing_field"] == "vendor_tax_id":
+        return (
+            "The invoice does not show the vendor's tax ID or GST number. Without it the "
+            "vendor's registration cannot be verified and input tax may not be claimable, "
+            "so request a corrected invoice."
+        )
+    return (
+        f"No tax amount is stated on this invoice of {risk_flag['evidence']['total_amount']:,.2f}. "
+        "Check whether the supply is tax-exempt or the tax was omitted, and request a corrected "
+        "invoice if needed."
+    )
+
+
+# Templated explanations for rule-based risks whose evidence speaks for itself;
+# other risk types, and any CRITICAL flag, are explained by the LLM
+STATIC_EXPLANATIONS: dict[str, Callable[[dict[str, Any]], str]] = {
+    "HIGH_VALUE_TRANSACTION": _explain_high_value,
+    "UNUSUAL_PAYMENT_TERMS": _explain_payment_terms,
+    "ROUND_NUMBER_ANOMALY": _explain_round_number,
+    "MISSING_TAX_INFORMATION": _explain_missing_tax,
+}
+
+
+def static_explanation(risk_flag: dict[str, Any]) -> Optional[str]:
+    """Explain a risk flag from a template, or return None if it needs the LLM."""
+    if risk_flag.get("risk_level") == RiskLevel.CRITICAL.value:
+        return None
+    
+    template = STATIC_EXPLANATIONS.get(risk_flag.get("risk_type"))
+    if template is None:
+        return None
+    
+    try:
+        return template(risk_flag)
+    except (KeyError, TypeError, ValueError):
+        return None
+
 
 class RiskDetector:
     """
@@ -26,25 +161,32 @@ class RiskDetector:
     def __init__(self):
         """Initialize risk detector."""
         if settings.google_api_key:
-            logger.info("Initializing Gemini for risk explanations")
-            self.llm = ChatGoogleGenerativeAI(
-                model=settings.google_model,
+            logger.info(f"Initializing Gemini {settings.explanation_google_model} for risk explanations")
+            self.explanation_llm = ChatGoogleGenerativeAI(
+                model=settings.explanation_google_model,
                 temperature=0.3,
+                max_output_tokens=EXPLANATION_MAX_TOKENS,
                 google_api_key=settings.google_api_key,
                 convert_system_message_to_human=True,
             )
         else:
-            logger.info("Initializing OpenAI for risk explanations")
-            self.llm = ChatOpenAI(
-                model=settings.openai_model,
+            logger.info(f"Initializing OpenAI {settings.explanation_openai_model} for risk explanations")
+            self.explanation_llm = ChatOpenAI(
+                model=settings.explanation_openai_model,
                 temperature=0.3,
+                max_tokens=EXPLANATION_MAX_TOKENS,
                 api_key=settings.openai_api_key,
             )
+        
+        self.explanation_chain = EXPLANATION_PROMPT | self.explanation_llm.bind(stop=EXPLANATION_STOP)
+        
+        # Explanations being generated, by cache key, so identical requests share one call
+        self._inflight: dict[str, asyncio.Future] = {}
     
     def detect_invoice_risks(
         self,
         extracted_data: dict[str, Any],
-        validation_results: list
+        validation_results: list[FinancialValidation]
     ) -> list[dict[str, Any]]:
         """
         Detect risks in invoice data.
@@ -58,59 +200,57 @@ class RiskDetector:
         """
         risks = []
         
+        # Parsed once; the amount rules only compare floats
+        amount = _as_float(extracted_data.get("total_amount"))
+        
         # Risk 1: High-value invoice
-        risks.extend(self._detect_high_value_invoice(extracted_data))
+        risks.extend(self._detect_high_value_invoice(extracted_data, amount))
         
         # Risk 2: Unusual payment terms
         risks.extend(self._detect_unusual_payment_terms(extracted_data))
         
         # Risk 3: Round number suspicion
-        risks.extend(self._detect_round_numbers(extracted_data))
+        risks.extend(self._detect_round_numbers(extracted_data, amount))
         
         # Risk 4: Missing tax ID (compliance risk)
-        risks.extend(self._detect_missing_tax_info(extracted_data))
+        risks.extend(self._detect_missing_tax_info(extracted_data, amount))
         
         # Risk 5: Failed validations
         risks.extend(self._convert_validation_failures_to_risks(validation_results))
         
         return risks
     
-    def _detect_high_value_invoice(self, data: dict[str, Any]) -> list[dict[str, Any]]:
+    def _detect_high_value_invoice(
+        self,
+        data: dict[str, Any],
+        amount: Optional[float]
+    ) -> list[dict[str, Any]]:
         """Detect high-value invoices."""
-        total_amount = data.get("total_amount")
-        
-        if total_amount is None:
+        if amount is None:
             return []
         
-        try:
-            amount = Decimal(str(total_amount))
-            high_value_threshold = Decimal("10000")
-            critical_threshold = Decimal("100000")
-            
-            if amount >= critical_threshold:
-                return [{
-                    "risk_type": "HIGH_VALUE_TRANSACTION",
-                    "risk_level": RiskLevel.CRITICAL.value,
-                    "description": f"Critical value invoice: {data.get('currency', 'USD')} {amount}",
-                    "evidence": {
-                        "amount": float(amount),
-                        "threshold": float(critical_threshold),
-                        "currency": data.get("currency", "USD")
-                    }
-                }]
-            elif amount >= high_value_threshold:
-                return [{
-                    "risk_type": "HIGH_VALUE_TRANSACTION",
-                    "risk_level": RiskLevel.MEDIUM.value,
-                    "description": f"High value invoice: {data.get('currency', 'USD')} {amount}",
-                    "evidence": {
-                        "amount": float(amount),
-                        "threshold": float(high_value_threshold),
-                        "currency": data.get("currency", "USD")
-                    }
-                }]
-        except (ValueError, TypeError):
-            pass
+        if amount >= CRITICAL_VALUE_THRESHOLD:
+            return [{
+                "risk_type": "HIGH_VALUE_TRANSACTION",
+                "risk_level": RiskLevel.CRITICAL.value,
+                "description": f"Critical value invoice: {data.get('currency', 'USD')} {data.get('total_amount')}",
+                "evidence": {
+                    "amount": amount,
+                    "threshold": CRITICAL_VALUE_THRESHOLD,
+                    "currency": data.get("currency", "USD")
+                }
+            }]
+        elif amount >= HIGH_VALUE_THRESHOLD:
+            return [{
+                "risk_type": "HIGH_VALUE_TRANSACTION",
+                "risk_level": RiskLevel.MEDIUM.value,
+                "description": f"High value invoice: {data.get('currency', 'USD')} {data.get('total_amount')}",
+                "evidence": {
+                    "amount": amount,
+                    "threshold": HIGH_VALUE_THRESHOLD,
+                    "currency": data.get("currency", "USD")
+                }
+            }]
         
         return []
     
@@ -123,8 +263,8 @@ class RiskDetector:
             return []
         
         try:
-            invoice_date = datetime.fromisoformat(invoice_date_str.replace("Z", "+00:00"))
-            due_date = datetime.fromisoformat(due_date_str.replace("Z", "+00:00"))
+            invoice_date = datetime.fromisoformat(invoice_date_str)
+            due_date = datetime.fromisoformat(due_date_str)
             
             payment_days = (due_date - invoice_date).days
             
@@ -158,40 +298,39 @@ class RiskDetector:
         
         return []
     
-    def _detect_round_numbers(self, data: dict[str, Any]) -> list[dict[str, Any]]:
+    def _detect_round_numbers(
+        self,
+        data: dict[str, Any],
+        amount: Optional[float]
+    ) -> list[dict[str, Any]]:
         """Detect suspiciously round numbers (potential fraud indicator)."""
-        total_amount = data.get("total_amount")
-        
-        if total_amount is None:
+        if amount is None:
             return []
         
-        try:
-            amount = Decimal(str(total_amount))
-            
-            # Check if it's a round number (e.g., 10000.00, 5000.00)
-            if amount >= Decimal("1000"):
-                # Check if last 2 digits are 00
-                amount_str = str(amount)
-                if amount_str.endswith("00.0") or amount_str.endswith("000"):
-                    return [{
-                        "risk_type": "ROUND_NUMBER_ANOMALY",
-                        "risk_level": RiskLevel.LOW.value,
-                        "description": f"Suspiciously round total amount: {data.get('currency', 'USD')} {amount}",
-                        "evidence": {
-                            "amount": float(amount),
-                            "note": "Round numbers may indicate estimate rather than actual invoice"
-                        }
-                    }]
-        except (ValueError, TypeError):
-            pass
+        # Check if it's a round number, i.e. a whole multiple of 100 (e.g., 10000.00, 5000.00)
+        if amount >= ROUND_NUMBER_MIN_AMOUNT:
+            cents = round(amount * 100)
+            if cents % 10000 == 0:
+                return [{
+                    "risk_type": "ROUND_NUMBER_ANOMALY",
+                    "risk_level": RiskLevel.LOW.value,
+                    "description": f"Suspiciously round total amount: {data.get('currency', 'USD')} {data.get('total_amount')}",
+                    "evidence": {
+                        "amount": amount,
+                        "note": "Round numbers may indicate estimate rather than actual invoice"
+                    }
+                }]
         
         return []
     
-    def _detect_missing_tax_info(self, data: dict[str, Any]) -> list[dict[str, Any]]:
+    def _detect_missing_tax_info(
+        self,
+        data: dict[str, Any],
+        amount: Optional[float]
+    ) -> list[dict[str, Any]]:
         """Detect missing tax information (compliance risk)."""
         vendor_tax_id = data.get("vendor_tax_id")
         tax_amount = data.get("tax_amount")
-        total_amount = data.get("total_amount")
         
         risks = []
         
@@ -205,52 +344,53 @@ class RiskDetector:
             })
         
         # Missing tax amount on significant invoice
-        if tax_amount is None and total_amount:
-            try:
-                if Decimal(str(total_amount)) > Decimal("100"):
-                    risks.append({
-                        "risk_type": "MISSING_TAX_INFORMATION",
-                        "risk_level": RiskLevel.MEDIUM.value,
-                        "description": "Tax amount not specified on invoice",
-                        "evidence": {"missing_field": "tax_amount", "total_amount": float(total_amount)}
-                    })
-            except (ValueError, TypeError):
-                pass
+        if tax_amount is None and amount and amount > MISSING_TAX_MIN_AMOUNT:
+            risks.append({
+                "risk_type": "MISSING_TAX_INFORMATION",
+                "risk_level": RiskLevel.MEDIUM.value,
+                "description": "Tax amount not specified on invoice",
+                "evidence": {"missing_field": "tax_amount", "total_amount": amount}
+            })
         
         return risks
     
     def _convert_validation_failures_to_risks(
         self,
-        validation_results: list
+        validation_results: list[FinancialValidation]
     ) -> list[dict[str, Any]]:
         """Convert failed validations to risk flags."""
-        risks = []
-        
-        for validation in validation_results:
-            if hasattr(validation, "is_valid") and not validation.is_valid:
-                severity_to_risk = {
-                    "ERROR": RiskLevel.HIGH.value,
-                    "WARNING": RiskLevel.MEDIUM.value,
+        return [
+            {
+                "risk_type": "VALIDATION_FAILURE",
+                "risk_level": SEVERITY_TO_RISK_LEVEL.get(validation.severity, RiskLevel.MEDIUM.value),
+                "description": f"Validation failed: {validation.validation_type}",
+                "evidence": {
+                    "validation_type": validation.validation_type,
+                    "error_message": validation.error_message,
+                    "expected": validation.expected_value,
+                    "actual": validation.actual_value,
                 }
-                
-                risk_level = severity_to_risk.get(
-                    getattr(validation, "severity", "WARNING"),
-                    RiskLevel.MEDIUM.value
-                )
-                
-                risks.append({
-                    "risk_type": "VALIDATION_FAILURE",
-                    "risk_level": risk_level,
-                    "description": f"Validation failed: {validation.validation_type}",
-                    "evidence": {
-                        "validation_type": validation.validation_type,
-                        "error_message": validation.error_message,
-                        "expected": validation.expected_value,
-                        "actual": validation.actual_value,
-                    }
-                })
-        
-        return risks
+            }
+            for validation in validation_results
+            if not validation.is_valid
+        ]
+    
+    def _explanation_inputs(
+        self,
+        risk_flag: dict[str, Any],
+        document_context: dict[str, Any]
+    ) -> dict[str, Any]:
+        """Build the explanation prompt variables for a risk flag."""
+        return {
+            "risk_type": risk_flag.get("risk_type"),
+            "risk_level": risk_flag.get("risk_level"),
+            "description": risk_flag.get("description"),
+            # Compact JSON spends fewer tokens than the dict repr
+            "evidence": orjson.dumps(
+                risk_flag.get("evidence") or {}, option=orjson.OPT_NON_STR_KEYS, default=str
+            ).decode(),
+            "doc_type": document_context.get("document_type", "Unknown"),
+        }
     
     async def generate_ai_explanation(
         self,
@@ -262,37 +402,146 @@ class RiskDetector:
         
         Args:
             risk_flag: Risk flag data
-            document_context: Document and extraction context
+            document_context: Document context (document_type)
             
         Returns:
             AI-generated explanation
         """
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", """You are a financial auditor explaining risk flags to users.
-Provide clear, professional explanations of why this risk was flagged.
-Be specific and reference the evidence. Keep it concise (2-3 sentences)."""),
-            ("user", """Explain this financial risk flag:
-
-Risk Type: {risk_type}
-Risk Level: {risk_level}
-Description: {description}
-Evidence: {evidence}
-
-Document Type: {doc_type}
-Context: {context}
-
-Provide a clear explanation for non-technical users.""")
-        ])
+        explanation = (await self.generate_ai_explanations([risk_flag], document_context))[0]
+        if isinstance(explanation, Exception):
+            raise explanation
+        return explanation
+    
+    async def stream_ai_explanation(
+        self,
+        risk_flag: dict[str, Any],
+        document_context: dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Yield an explanation for a risk flag as it is generated.
+        
+        A templated or cached explanation is yielded whole; a generated one is
+        cached once complete.
+        """
+        explanation = static_explanation(risk_flag)
+        if explanation is not None:
+            yield explanation
+            return
         
-        chain = prompt | self.llm
+        doc_type = document_context.get("document_type", "Unknown")
+        cache_key = explanation_cache_key(risk_flag, doc_type)
         
-        response = await chain.ainvoke({
-            "risk_type": risk_flag.get("risk_type"),
-            "risk_level": risk_flag.get("risk_level"),
-            "description": risk_flag.get("description"),
-            "evidence": str(risk_flag.get("evidence", {})),
-            "doc_type": document_context.get("document_type", "Unknown"),
-            "context": str(document_context.get("extracted_data", {}))[:500],
-        })
+        if settings.llm_cache_enabled:
+            try:
+                cached = await explanation_cache.get(cache_key)
+                if cached is not None:
+                    yield cached
+                    return
+            except Exception as e:
+                logger.warning(f"Explanation cache lookup failed: {str(e)}")
+        
+        parts = []
+        async for chunk in self.explanation_chain.astream(
+            self._explanation_inputs(risk_flag, document_context)
+        ):
+            if chunk.content:
+                parts.append(chunk.content)
+                yield chunk.content
+        
+        if settings.llm_cache_enabled and parts:
+            try:
+                await explanation_cache.set(cache_key, "".join(parts).strip())
+            except Exception as e:
+                logger.warning(f"Explanation cache store failed: {str(e)}")
+    
+    async def generate_ai_explanations(
+        self,
+        risk_flags: list[dict[str, Any]],
+        document_context: dict[str, Any]
+    ) -> list[Union[str, Exception]]:
+        """
+        Generate explanations for several risk flags of one document.
+        
+        Templated and cached explanations are returned directly; the rest are
+        requested in one abatch call with at most EXPLANATION_CONCURRENCY calls
+        in flight. Flags with the same cache key share one call, as do flags
+        whose explanation another caller is already generating.
         
-        return response.content.strip()
+        Args:
+            risk_flags: Risk flag data
+            document_context: Document context (document_type)
+            
+        Returns:
+            Explanation per flag, in order, or the exception its call raised
+        """
+        doc_type = document_context.get("document_type", "Unknown")
+        cache_keys = [explanation_cache_key(rf, doc_type) for rf in risk_flags]
+        explanations: list[Union[str, Exception, None]] = [
+            static_explanation(rf) for rf in risk_flags
+        ]
+        
+        missing = [i for i, explanation in enumerate(explanations) if explanation is None]
+        if missing and settings.llm_cache_enabled:
+            try:
+                cached = await explanation_cache.multi_get([cache_keys[i] for i in missing])
+                for i, explanation in zip(missing, cached):
+                    explanations[i] = explanation
+                missing = [i for i in missing if explanations[i] is None]
+            except Exception as e:
+                logger.warning(f"Explanation cache lookup failed: {str(e)}")
+        
+        if not missing:
+            return explanations
+        
+        # One future per distinct key; only keys nobody is generating yet are requested
+        futures: dict[str, asyncio.Future] = {}
+        requested: list[int] = []
+        for i in missing:
+            key = cache_keys[i]
+            if key in futures:
+                continue
+            if key in self._inflight:
+                futures[key] = self._inflight[key]
+            else:
+                futures[key] = self._inflight[key] = asyncio.get_running_loop().create_future()
+                requested.append(i)
+        
+        if requested:
+            try:
+                responses = await self.explanation_chain.abatch(
+                    [self._explanation_inputs(risk_flags[i], document_context) for i in requested],
+                    config={"max_concurrency": EXPLANATION_CONCURRENCY},
+                    return_exceptions=True,
+                )
+                
+                fresh = []
+                for i, response in zip(requested, responses):
+                    if isinstance(response, Exception):
+                        futures[cache_keys[i]].set_result(response)
+                    else:
+                        explanation = response.content.strip()
+                        futures[cache_keys[i]].set_result(explanation)
+                        fresh.append((cache_keys[i], explanation))
+                
+                if settings.llm_cache_enabled and fresh:
+                    try:
+                        await explanation_cache.multi_set(fresh)
+                    except Exception as e:
+                        logger.warning(f"Explanation cache store failed: {str(e)}")
+            finally:
+                for i in requested:
+                    future = self._inflight.pop(cache_keys[i])
+                    if not future.done():
+                        future.set_result(RuntimeError("Explanation request was cancelled"))
+        
+        for i in missing:
+            # Shielded so a cancelled caller does not cancel a future other callers share
+            explanations[i] = await asyncio.shield(futures[cache_keys[i]])
+        
+        return explanations
+
+
+@lru_cache
+def get_risk_detector() -> RiskDetector:
+    """Get the shared risk detector instance."""
+    return RiskDetector()
@@ -1,21 +1,115 @@
 """Semantic search service using embeddings and pgvector."""
 
+import asyncio
+import contextlib
+import hashlib
 import logging
-from typing import Optional
+import math
+from functools import lru_cache
+from typing import Awaitable, Optional
 from uuid import UUID
 
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+import orjson
 from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
-from sqlalchemy import select, text
+from sqlalchemy import delete, insert, text
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.cache import query_embedding_cache
 from app.config import get_settings
 from app.models import DocumentChunk, Document
 
 logger = logging.getLogger(__name__)
 settings = get_settings()
 
+# Distance expression per ANN index type; it must match the indexed
+# expression for the planner to use the index
+_DISTANCE_EXPRESSIONS = {
+    "hnsw": "dc.embedding <#> CAST(:query_embedding AS halfvec(768))",
+    "diskann": "dc.embedding::vector(768) <#> CAST(:query_embedding AS vector(768))",
+    "binary": "dc.embedding <#> CAST(:query_embedding AS halfvec(768))",
+}
+
+# Index types that only rank candidates approximately; their index
+# expression picks RERANK_FACTOR * top_k candidates, which are then
+# re-ranked by the exact distance above
+_CANDIDATE_EXPRESSIONS = {
+    "binary": (
+        "binary_quantize(dc.embedding)::bit(768) "
+        "<~> binary_quantize(CAST(:query_embedding AS halfvec(768)))::bit(768)"
+    ),
+}
+RERANK_FACTOR = 10
+
+# Per-index GUC for the ANN candidate list size; search widens it with top_k
+# (pgvector's default of 40 can return fewer than top_k rows once filtered)
+_SEARCH_WIDTH_SETTINGS = {
+    "hnsw": "hnsw.ef_search",
+    "diskann": "diskann.query_search_list_size",
+    "binary": "hnsw.ef_search",
+}
+# Filtered HNSW searches keep scanning the index until enough rows pass the
+# filters (pgvector 0.8 iterative scans) instead of returning fewer than
+# top_k; DiskANN's streaming search does this by itself
+_ITERATIVE_SCAN_SETTINGS = {
+    "hnsw": "hnsw.iterative_scan",
+    "binary": "hnsw.iterative_scan",
+}
+MIN_SEARCH_WIDTH = 40
+MAX_SEARCH_WIDTH = 1000  # hnsw.ef_search upper bound
+SEARCH_WIDTH_PER_RESULT = 4
+
+# Cap on concurrent embeddings requests per process
+EMBEDDING_CONCURRENCY = 10
+
+# Embedded batches a document holds while they wait to be stored
+EMBEDDING_PIPELINE_DEPTH = 2
+
+# Preferred chunk boundaries, strongest first
+CHUNK_SEPARATORS = ("\n\n", "\n", ". ", " ")
+
+
+def chunk_offsets(text: str, size: int, overlap: int) -> list[tuple[int, int]]:
+    """
+    Compute (start, end) offsets of overlapping chunks of at most `size` characters.
+    
+    Each chunk ends on the strongest separator found in its second half, and
+    the overlap carried into the next chunk starts on a word boundary, so
+    boundaries are located with find/rfind instead of building intermediate splits.
+    """
+    offsets = []
+    length = len(text)
+    start = 0
+    
+    while start < length:
+        end = min(start + size, length)
+        if end < length:
+            floor = start + size // 2
+            for separator in CHUNK_SEPARATORS:
+                cut = text.rfind(separator, floor, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        
+        offsets.append((start, end))
+        if end >= length:
+            break
+        
+        # Carry the last `overlap` characters over, starting after a space
+        carry = end - overlap
+        space = text.find(" ", carry, end)
+        start = max(space + 1 if space != -1 else carry, start + 1)
+    
+    return offsets
+
+
+def _normalize(vector: list[float]) -> list[float]:
+    """Scale an embedding to unit length so inner product equals cosine similarity."""
+    norm = math.sqrt(sum(x * x for x in vector))
+    if norm == 0:
+        return vector
+    return [x / norm for x in vector]
+
 
 class SemanticSearchService:
     """Semantic search using embeddings and vector similarity."""
@@ -35,66 +129,121 @@ class SemanticSearchService:
                 openai_api_key=settings.openai_api_key,
             )
         
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=settings.chunk_size,
-            chunk_overlap=settings.chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", ".", " ", ""],
-        )
+        self.embedding_semaphore = asyncio.Semaphore(EMBEDDING_CONCURRENCY)
+    
+    def _split_text(self, document_id: UUID, document_text: str) -> list[str]:
+        """Split document text into non-empty chunks."""
+        if not document_text or not document_text.strip():
+            logger.warning(f"Empty document text for document {document_id}")
+            return []
+        
+        # Locate chunk boundaries first and slice each chunk exactly once
+        offsets = chunk_offsets(document_text, settings.chunk_size, settings.chunk_overlap)
+        chunks = [
+            chunk for chunk in (document_text[start:end].strip() for start, end in offsets)
+            if chunk
+        ]
+        
+        logger.info(f"Created {len(chunks)} chunks for document {document_id}")
+        
+        return chunks
+    
+    async def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        """Embed one batch of texts, bounded by the embedding semaphore."""
+        async with self.embedding_semaphore:
+            return await self.embeddings.aembed_documents(texts)
     
-    async def create_chunks_and_embeddings(
+    async def embed_and_store_chunks(
         self,
         db: AsyncSession,
         document_id: UUID,
         document_text: str,
-        metadata: Optional[dict] = None
+        metadata: Awaitable[dict]
     ) -> int:
         """
-        Create text chunks and generate embeddings for a document.
+        Embed a document's chunks and insert them, replacing any it already has.
+        
+        Embedding starts at once, while batches are inserted only after
+        `metadata` resolves; at most EMBEDDING_PIPELINE_DEPTH embedded batches
+        wait in between, so memory stays bounded however long the document.
+        Chunks left by an earlier run are deleted in the same transaction,
+        which the caller commits once the document's own results are committed.
         
         Args:
             db: Database session
             document_id: Document UUID
             document_text: Full text of document
-            metadata: Optional metadata for chunks
+            metadata: Resolves to the metadata stored with every chunk
             
         Returns:
-            Number of chunks created
+            Number of chunks inserted
         """
-        if not document_text or not document_text.strip():
-            logger.warning(f"Empty document text for document {document_id}")
-            return 0
-        
-        # Split text into chunks
-        chunks = self.text_splitter.split_text(document_text)
+        chunks = self._split_text(document_id, document_text)
+        batch_size = settings.embedding_batch_size
+        queue: asyncio.Queue = asyncio.Queue(maxsize=EMBEDDING_PIPELINE_DEPTH)
         
-        logger.info(f"Created {len(chunks)} chunks for document {document_id}")
+        async def produce() -> None:
+            # A failure is handed to the consumer, which would otherwise wait forever
+            try:
+                for start in range(0, len(chunks), batch_size):
+                    embeddings = await self._embed_batch(chunks[start:start + batch_size])
+                    await queue.put((start, [_normalize(e) for e in embeddings]))
+            except Exception as e:
+                await queue.put(e)
+            else:
+                await queue.put(None)
         
-        # Generate embeddings for all chunks
+        producer = asyncio.create_task(produce())
         try:
-            embeddings = await self.embeddings.aembed_documents(chunks)
-        except Exception as e:
-            logger.error(f"Error generating embeddings: {str(e)}")
-            raise
-        
-        # Store chunks in database
-        chunk_objects = []
-        for idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings)):
-            chunk_obj = DocumentChunk(
-                document_id=document_id,
-                chunk_text=chunk_text,
-                chunk_index=idx,
-                embedding=embedding,
-                chunk_metadata=metadata or {},
-            )
-            chunk_objects.append(chunk_obj)
-        
-        db.add_all(chunk_objects)
-        await db.commit()
+            chunk_metadata = await metadata
+            await self.delete_chunks_for_document(db, document_id)
+            
+            while (item := await queue.get()) is not None:
+                if isinstance(item, Exception):
+                    logger.error(f"Error generating embeddings: {str(item)}")
+                    raise item
+                start, embeddings = item
+                await self._insert_chunks(
+                    db,
+                    document_id,
+                    chunks[start:start + len(embeddings)],
+                    embeddings,
+                    chunk_metadata,
+                    start
+                )
+        finally:
+            # Wait for the producer so no embedding call outlives the session
+            producer.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await producer
         
-        logger.info(f"Stored {len(chunk_objects)} chunks for document {document_id}")
+        logger.info(f"Inserted {len(chunks)} chunks for document {document_id}")
         
-        return len(chunk_objects)
+        return len(chunks)
+    
+    async def _insert_chunks(
+        self,
+        db: AsyncSession,
+        document_id: UUID,
+        chunks: list[str],
+        embeddings: list[list[float]],
+        chunk_metadata: dict,
+        first_index: int = 0
+    ) -> None:
+        """Insert embedded chunks with one multi-row INSERT, bypassing the ORM unit of work."""
+        await db.execute(
+            insert(DocumentChunk),
+            [
+                {
+                    "document_id": document_id,
+                    "chunk_text": chunk_text,
+                    "chunk_index": idx,
+                    "embedding": embedding,
+                    "chunk_metadata": chunk_metadata,
+                }
+                for idx, (chunk_text, embedding) in enumerate(zip(chunks, embeddings), first_index)
+            ]
+        )
     
     async def search(
         self,
@@ -117,26 +266,24 @@ class SemanticSearchService:
         Returns:
             List of search results with similarity scores
         """
-        # Generate query embedding
-        try:
-            query_embedding = await self.embeddings.aembed_query(query)
-        except Exception as e:
-            logger.error(f"Error generating query embedding: {str(e)}")
-            raise
+        query_embedding = await self._embed_query(query)
         
         # Build the similarity search query
-        # Using cosine distance (1 - cosine similarity)
-        base_query = """
+        # Embeddings are unit-normalized, so the negated inner product (<#>)
+        # orders identically to cosine distance without per-row normalization
+        distance = _DISTANCE_EXPRESSIONS[settings.vector_index_type]
+        candidate_order = _CANDIDATE_EXPRESSIONS.get(settings.vector_index_type)
+        base_query = f"""
         SELECT 
-            dc.id,
+            dc.id AS chunk_id,
             dc.document_id,
             dc.chunk_text,
             dc.chunk_index,
             dc.page_number,
-            dc.chunk_metadata,
-            d.filename,
+            dc.chunk_metadata AS metadata,
+            d.filename AS document_filename,
             d.document_type,
-            1 - (dc.embedding <=> :query_embedding) as similarity_score
+            (({distance}) * -1)::float8 AS similarity_score
         FROM document_chunks dc
         JOIN documents d ON dc.document_id = d.id
         WHERE 1=1
@@ -152,42 +299,82 @@ class SemanticSearchService:
             base_query += " AND d.user_id = :user_id"
             params["user_id"] = str(user_id)
         
-        base_query += """
-        ORDER BY dc.embedding <=> :query_embedding
-        LIMIT :top_k
-        """
+        if candidate_order:
+            # Shortlist by the quantized index, then re-rank the shortlist exactly
+            fetch_count = top_k * RERANK_FACTOR
+            base_query = f"""
+            SELECT * FROM ({base_query}
+            ORDER BY {candidate_order}
+            LIMIT :fetch_count
+            ) candidates
+            ORDER BY similarity_score DESC
+            LIMIT :top_k
+            """
+            params["fetch_count"] = fetch_count
+        else:
+            fetch_count = top_k
+            base_query += f"""
+            ORDER BY {distance}
+            LIMIT :top_k
+            """
         params["top_k"] = top_k
         
-        # Execute search
+        # Scale the index's candidate list with the rows fetched from it, for this transaction only
+        search_width = min(max(fetch_count * SEARCH_WIDTH_PER_RESULT, MIN_SEARCH_WIDTH), MAX_SEARCH_WIDTH)
+        scan_settings = {_SEARCH_WIDTH_SETTINGS[settings.vector_index_type]: str(search_width)}
+        
+        iterative_scan = _ITERATIVE_SCAN_SETTINGS.get(settings.vector_index_type)
+        if iterative_scan and (document_type or user_id):
+            scan_settings[iterative_scan] = "strict_order"
+        
+        await db.execute(
+            text(
+                "SELECT set_config(name, value, true) "
+                "FROM unnest(CAST(:names AS text[]), CAST(:values AS text[])) AS s(name, value)"
+            ),
+            {"names": list(scan_settings), "values": list(scan_settings.values())}
+        )
+        
+        # Execute search; the column aliases are the result keys
         result = await db.execute(text(base_query), params)
-        rows = result.fetchall()
-        
-        # Format results
-        search_results = []
-        for row in rows:
-            search_results.append({
-                "chunk_id": row[0],
-                "document_id": row[1],
-                "chunk_text": row[2],
-                "chunk_index": row[3],
-                "page_number": row[4],
-                "metadata": row[5],
-                "document_filename": row[6],
-                "document_type": row[7],
-                "similarity_score": float(row[8]),
-            })
+        search_results = [dict(row) for row in result.mappings()]
         
         logger.info(f"Semantic search returned {len(search_results)} results for query: {query}")
         
         return search_results
     
+    async def _embed_query(self, query: str) -> list[float]:
+        """Embed a search query, reusing cached embeddings of the same normalized query."""
+        normalized = " ".join(query.lower().split())
+        cache_key = hashlib.sha256(f"{self.embeddings.model}:{normalized}".encode()).hexdigest()
+        
+        try:
+            cached = await query_embedding_cache.get(cache_key)
+            if cached is not None:
+                return orjson.loads(cached)
+        except Exception as e:
+            logger.warning(f"Query embedding cache lookup failed: {str(e)}")
+        
+        try:
+            query_embedding = _normalize(await self.embeddings.aembed_query(normalized))
+        except Exception as e:
+            logger.error(f"Error generating query embedding: {str(e)}")
+            raise
+        
+        try:
+            await query_embedding_cache.set(cache_key, orjson.dumps(query_embedding).decode())
+        except Exception as e:
+            logger.warning(f"Query embedding cache store failed: {str(e)}")
+        
+        return query_embedding
+    
     async def delete_chunks_for_document(
         self,
         db: AsyncSession,
         document_id: UUID
     ) -> int:
         """
-        Delete all chunks for a document.
+        Delete all chunks for a document in the caller's transaction.
         
         Args:
             db: Database session
@@ -196,19 +383,18 @@ class SemanticSearchService:
         Returns:
             Number of chunks deleted
         """
-        # Get count first
-        count_result = await db.execute(
-            select(DocumentChunk).where(DocumentChunk.document_id == document_id)
+        # One DELETE; rowcount gives the number removed
+        result = await db.execute(
+            delete(DocumentChunk).where(DocumentChunk.document_id == document_id)
         )
-        chunks = count_result.scalars().all()
-        count = len(chunks)
-        
-        # Delete chunks
-        for chunk in chunks:
-            await db.delete(chunk)
-        
-        await db.commit()
+        count = result.rowcount
         
         logger.info(f"Deleted {count} chunks for document {document_id}")
         
         return count
+
+
+@lru_cache
+def get_search_service() -> SemanticSearchService:
+    """Get the shared semantic search service instance."""
+    return SemanticSearchService()
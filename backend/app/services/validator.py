@@ -1,16 +1,46 @@
 """Financial validation engine - CODE-BASED validations only."""
 
 import logging
+import math
 from typing import Any, Optional
 from datetime import datetime, timedelta
-from decimal import Decimal
 
 logger = logging.getLogger(__name__)
 
+# Amounts are compared in whole cents and may differ by one cent for rounding
+AMOUNT_TOLERANCE_CENTS = 1
+
+# Statement transaction types that count toward total credits (0) or total debits (1),
+# with the casings extractors return so most lookups skip lower()
+TRANSACTION_SIDES = {
+    spelling: side
+    for name, side in (("credit", 0), ("deposit", 0), ("debit", 1), ("withdrawal", 1))
+    for spelling in (name, name.upper(), name.capitalize())
+}
+
+INVOICE_REQUIRED_FIELDS = (
+    "invoice_number",
+    "invoice_date",
+    "vendor_name",
+    "total_amount",
+)
+
+# Invoice amounts that must not be negative
+NON_NEGATIVE_FIELDS = ("subtotal", "tax_amount", "total_amount")
+
 
 class ValidationResult:
     """Result of a validation check."""
     
+    __slots__ = (
+        "validation_type",
+        "is_valid",
+        "expected_value",
+        "actual_value",
+        "error_message",
+        "severity",
+    )
+    
     def __init__(
         self,
         validation_type: str,
@@ -28,6 +58,43 @@ class ValidationResult:
         self.severity = severity
 
 
+# Results are read-only once built, so each check shares its passing result
+SUCCESS_RESULTS = {
+    validation_type: ValidationResult(validation_type=validation_type, is_valid=True)
+    for validation_type in (
+        "INVOICE_TOTAL_CALCULATION",
+        "LINE_ITEMS_SUM",
+        "TAX_CALCULATION",
+        "REQUIRED_FIELDS",
+        "DATE_LOGIC",
+        "NEGATIVE_AMOUNTS",
+        "BANK_BALANCE_CALCULATION",
+        "TRANSACTION_TOTALS",
+    )
+}
+
+# Sparse extractions (e.g. poor OCR) often lack the totals; the failure is always the same
+MISSING_TOTALS_RESULT = ValidationResult(
+    validation_type="INVOICE_TOTAL_CALCULATION",
+    is_valid=False,
+    error_message="Missing subtotal, tax, or total amount",
+    severity="ERROR"
+)
+
+
+def _is_negative(value: Any) -> bool:
+    """Whether an extracted amount is numeric and below zero."""
+    try:
+        return float(value) < 0
+    except (ValueError, TypeError):
+        return False
+
+
+def _cents(value: Any) -> int:
+    """Convert an extracted amount to whole cents; amounts are compared within one cent."""
+    return round(float(value) * 100)
+
+
 class FinancialValidator:
     """
     Code-based financial validation engine.
@@ -50,27 +117,15 @@ class FinancialValidator:
         Returns:
             List of validation results
         """
-        results = []
-        
-        # Rule 1: Total = Subtotal + Tax
-        results.append(self._validate_invoice_total(extracted_data))
-        
-        # Rule 2: Line items sum to subtotal
-        results.append(self._validate_line_items_sum(extracted_data))
-        
-        # Rule 3: Tax calculation
-        results.append(self._validate_tax_calculation(extracted_data))
-        
-        # Rule 4: Required fields present
-        results.append(self._validate_required_fields(extracted_data))
-        
-        # Rule 5: Date logic
-        results.append(self._validate_dates(extracted_data))
-        
-        # Rule 6: Negative amounts
-        results.append(self._validate_no_negative_amounts(extracted_data))
-        
-        return [r for r in results if r is not None]
+        return self._run_rules(INVOICE_RULES, extracted_data)
+    
+    def _run_rules(self, rules: tuple, data: dict[str, Any]) -> list[ValidationResult]:
+        """Apply each rule to the data, keeping the rules that produced a result."""
+        return [
+            result
+            for result in (rule(self, data) for rule in rules)
+            if result is not None
+        ]
     
     def _validate_invoice_total(self, data: dict[str, Any]) -> Optional[ValidationResult]:
         """Validate: total = subtotal + tax."""
@@ -78,38 +133,25 @@ class FinancialValidator:
         tax_amount = data.get("tax_amount")
         total_amount = data.get("total_amount")
         
-        if not all([subtotal is not None, tax_amount is not None, total_amount is not None]):
-            return ValidationResult(
-                validation_type="INVOICE_TOTAL_CALCULATION",
-                is_valid=False,
-                error_message="Missing subtotal, tax, or total amount",
-                severity="ERROR"
-            )
+        if subtotal is None or tax_amount is None or total_amount is None:
+            return MISSING_TOTALS_RESULT
         
         try:
-            subtotal = Decimal(str(subtotal))
-            tax_amount = Decimal(str(tax_amount))
-            total_amount = Decimal(str(total_amount))
-            
-            expected_total = subtotal + tax_amount
+            expected_total = _cents(subtotal) + _cents(tax_amount)
+            total_amount = _cents(total_amount)
             
             # Allow 0.01 difference for rounding
-            difference = abs(expected_total - total_amount)
-            
-            if difference > Decimal("0.01"):
+            if abs(expected_total - total_amount) > AMOUNT_TOLERANCE_CENTS:
                 return ValidationResult(
                     validation_type="INVOICE_TOTAL_CALCULATION",
                     is_valid=False,
-                    expected_value=float(expected_total),
-                    actual_value=float(total_amount),
-                    error_message=f"Total amount mismatch. Expected {expected_total}, got {total_amount}",
+                    expected_value=expected_total / 100,
+                    actual_value=total_amount / 100,
+                    error_message=f"Total amount mismatch. Expected {expected_total / 100:.2f}, got {total_amount / 100:.2f}",
                     severity="ERROR"
                 )
             
-            return ValidationResult(
-                validation_type="INVOICE_TOTAL_CALCULATION",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["INVOICE_TOTAL_CALCULATION"]
         except (ValueError, TypeError) as e:
             return ValidationResult(
                 validation_type="INVOICE_TOTAL_CALCULATION",
@@ -127,30 +169,25 @@ class FinancialValidator:
             return None
         
         try:
-            line_items_total = Decimal("0")
-            for item in line_items:
-                if isinstance(item, dict):
-                    quantity = Decimal(str(item.get("quantity", 0)))
-                    price = Decimal(str(item.get("unit_price", 0)))
-                    line_items_total += quantity * price
+            # fsum is correctly rounded, so the total in cents carries no float noise
+            line_items_total = _cents(math.fsum(
+                float(item.get("quantity", 0)) * float(item.get("unit_price", 0))
+                for item in line_items
+                if isinstance(item, dict)
+            ))
+            subtotal = _cents(subtotal)
             
-            subtotal = Decimal(str(subtotal))
-            difference = abs(line_items_total - subtotal)
-            
-            if difference > Decimal("0.01"):
+            if abs(line_items_total - subtotal) > AMOUNT_TOLERANCE_CENTS:
                 return ValidationResult(
                     validation_type="LINE_ITEMS_SUM",
                     is_valid=False,
-                    expected_value=float(subtotal),
-                    actual_value=float(line_items_total),
-                    error_message=f"Line items sum ({line_items_total}) does not match subtotal ({subtotal})",
+                    expected_value=subtotal / 100,
+                    actual_value=line_items_total / 100,
+                    error_message=f"Line items sum ({line_items_total / 100:.2f}) does not match subtotal ({subtotal / 100:.2f})",
                     severity="ERROR"
                 )
             
-            return ValidationResult(
-                validation_type="LINE_ITEMS_SUM",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["LINE_ITEMS_SUM"]
         except (ValueError, TypeError, KeyError) as e:
             return ValidationResult(
                 validation_type="LINE_ITEMS_SUM",
@@ -165,31 +202,25 @@ class FinancialValidator:
         tax_amount = data.get("tax_amount")
         tax_rate = data.get("tax_rate")
         
-        if not all([subtotal is not None, tax_amount is not None, tax_rate is not None]):
+        if subtotal is None or tax_amount is None or tax_rate is None:
             return None
         
         try:
-            subtotal = Decimal(str(subtotal))
-            tax_amount = Decimal(str(tax_amount))
-            tax_rate = Decimal(str(tax_rate)) / Decimal("100")
+            # Tax rate is a percentage; expected tax is rounded to the cent like the invoice's
+            expected_tax = round(_cents(subtotal) * float(tax_rate) / 100)
+            tax_amount = _cents(tax_amount)
             
-            expected_tax = subtotal * tax_rate
-            difference = abs(expected_tax - tax_amount)
-            
-            if difference > Decimal("0.01"):
+            if abs(expected_tax - tax_amount) > AMOUNT_TOLERANCE_CENTS:
                 return ValidationResult(
                     validation_type="TAX_CALCULATION",
                     is_valid=False,
-                    expected_value=float(expected_tax),
-                    actual_value=float(tax_amount),
-                    error_message=f"Tax calculation mismatch. Expected {expected_tax}, got {tax_amount}",
+                    expected_value=expected_tax / 100,
+                    actual_value=tax_amount / 100,
+                    error_message=f"Tax calculation mismatch. Expected {expected_tax / 100:.2f}, got {tax_amount / 100:.2f}",
                     severity="WARNING"
                 )
             
-            return ValidationResult(
-                validation_type="TAX_CALCULATION",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["TAX_CALCULATION"]
         except (ValueError, TypeError) as e:
             return ValidationResult(
                 validation_type="TAX_CALCULATION",
@@ -200,17 +231,7 @@ class FinancialValidator:
     
     def _validate_required_fields(self, data: dict[str, Any]) -> ValidationResult:
         """Validate: all required fields are present."""
-        required_fields = [
-            "invoice_number",
-            "invoice_date",
-            "vendor_name",
-            "total_amount"
-        ]
-        
-        missing_fields = []
-        for field in required_fields:
-            if not data.get(field):
-                missing_fields.append(field)
+        missing_fields = [field for field in INVOICE_REQUIRED_FIELDS if not data.get(field)]
         
         if missing_fields:
             return ValidationResult(
@@ -220,10 +241,7 @@ class FinancialValidator:
                 severity="ERROR"
             )
         
-        return ValidationResult(
-            validation_type="REQUIRED_FIELDS",
-            is_valid=True
-        )
+        return SUCCESS_RESULTS["REQUIRED_FIELDS"]
     
     def _validate_dates(self, data: dict[str, Any]) -> Optional[ValidationResult]:
         """Validate: date logic (due date after invoice date)."""
@@ -234,8 +252,8 @@ class FinancialValidator:
             return None
         
         try:
-            invoice_date = datetime.fromisoformat(invoice_date_str.replace("Z", "+00:00"))
-            due_date = datetime.fromisoformat(due_date_str.replace("Z", "+00:00"))
+            invoice_date = datetime.fromisoformat(invoice_date_str)
+            due_date = datetime.fromisoformat(due_date_str)
             
             if due_date < invoice_date:
                 return ValidationResult(
@@ -256,10 +274,7 @@ class FinancialValidator:
                     severity="WARNING"
                 )
             
-            return ValidationResult(
-                validation_type="DATE_LOGIC",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["DATE_LOGIC"]
         except (ValueError, TypeError) as e:
             return ValidationResult(
                 validation_type="DATE_LOGIC",
@@ -270,17 +285,11 @@ class FinancialValidator:
     
     def _validate_no_negative_amounts(self, data: dict[str, Any]) -> ValidationResult:
         """Validate: no negative amounts (fraud indicator)."""
-        fields_to_check = ["subtotal", "tax_amount", "total_amount"]
-        
-        negative_fields = []
-        for field in fields_to_check:
-            value = data.get(field)
-            if value is not None:
-                try:
-                    if Decimal(str(value)) < 0:
-                        negative_fields.append(field)
-                except (ValueError, TypeError):
-                    pass
+        negative_fields = [
+            field
+            for field in NON_NEGATIVE_FIELDS
+            if (value := data.get(field)) is not None and _is_negative(value)
+        ]
         
         if negative_fields:
             return ValidationResult(
@@ -290,22 +299,11 @@ class FinancialValidator:
                 severity="ERROR"
             )
         
-        return ValidationResult(
-            validation_type="NEGATIVE_AMOUNTS",
-            is_valid=True
-        )
+        return SUCCESS_RESULTS["NEGATIVE_AMOUNTS"]
     
     def validate_bank_statement(self, extracted_data: dict[str, Any]) -> list[ValidationResult]:
         """Validate bank statement data."""
-        results = []
-        
-        # Rule 1: Closing balance = Opening balance + Credits - Debits
-        results.append(self._validate_bank_balance(extracted_data))
-        
-        # Rule 2: Transaction totals match
-        results.append(self._validate_transaction_totals(extracted_data))
-        
-        return [r for r in results if r is not None]
+        return self._run_rules(BANK_STATEMENT_RULES, extracted_data)
     
     def _validate_bank_balance(self, data: dict[str, Any]) -> Optional[ValidationResult]:
         """Validate: closing = opening + credits - debits."""
@@ -314,32 +312,24 @@ class FinancialValidator:
         credits = data.get("total_credits")
         debits = data.get("total_debits")
         
-        if not all([opening is not None, closing is not None, credits is not None, debits is not None]):
+        if opening is None or closing is None or credits is None or debits is None:
             return None
         
         try:
-            opening = Decimal(str(opening))
-            closing = Decimal(str(closing))
-            credits = Decimal(str(credits))
-            debits = Decimal(str(debits))
-            
-            expected_closing = opening + credits - debits
-            difference = abs(expected_closing - closing)
+            expected_closing = _cents(opening) + _cents(credits) - _cents(debits)
+            closing = _cents(closing)
             
-            if difference > Decimal("0.01"):
+            if abs(expected_closing - closing) > AMOUNT_TOLERANCE_CENTS:
                 return ValidationResult(
                     validation_type="BANK_BALANCE_CALCULATION",
                     is_valid=False,
-                    expected_value=float(expected_closing),
-                    actual_value=float(closing),
-                    error_message=f"Balance mismatch. Expected {expected_closing}, got {closing}",
+                    expected_value=expected_closing / 100,
+                    actual_value=closing / 100,
+                    error_message=f"Balance mismatch. Expected {expected_closing / 100:.2f}, got {closing / 100:.2f}",
                     severity="ERROR"
                 )
             
-            return ValidationResult(
-                validation_type="BANK_BALANCE_CALCULATION",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["BANK_BALANCE_CALCULATION"]
         except (ValueError, TypeError) as e:
             return ValidationResult(
                 validation_type="BANK_BALANCE_CALCULATION",
@@ -358,37 +348,39 @@ class FinancialValidator:
             return None
         
         try:
-            actual_credits = Decimal("0")
-            actual_debits = Decimal("0")
-            
+            # Credit and debit totals in cents, summed exactly as integers
+            sides = [0, 0]
             for txn in transactions:
                 if isinstance(txn, dict):
-                    amount = Decimal(str(txn.get("amount", 0)))
-                    txn_type = txn.get("type", "").lower()
-                    
-                    if txn_type in ["credit", "deposit"]:
-                        actual_credits += amount
-                    elif txn_type in ["debit", "withdrawal"]:
-                        actual_debits += amount
+                    txn_type = txn.get("type")
+                    if not isinstance(txn_type, str):
+                        continue
+                    side = TRANSACTION_SIDES.get(txn_type)
+                    if side is None:
+                        side = TRANSACTION_SIDES.get(txn_type.lower())
+                    if side is not None:
+                        sides[side] += _cents(txn.get("amount", 0))
             
-            stated_credits = Decimal(str(stated_credits))
-            stated_debits = Decimal(str(stated_debits))
+            actual_credits, actual_debits = sides
+            stated_credits = _cents(stated_credits)
+            stated_debits = _cents(stated_debits)
             
-            credit_diff = abs(actual_credits - stated_credits)
-            debit_diff = abs(actual_debits - stated_debits)
-            
-            if credit_diff > Decimal("0.01") or debit_diff > Decimal("0.01"):
+            if (
+                abs(actual_credits - stated_credits) > AMOUNT_TOLERANCE_CENTS
+                or abs(actual_debits - stated_debits) > AMOUNT_TOLERANCE_CENTS
+            ):
                 return ValidationResult(
                     validation_type="TRANSACTION_TOTALS",
                     is_valid=False,
-                    error_message=f"Transaction totals mismatch. Credits: {actual_credits} vs {stated_credits}, Debits: {actual_debits} vs {stated_debits}",
+                    error_message=(
+                        f"Transaction totals mismatch. "
+                        f"Credits: {actual_credits / 100:.2f} vs {stated_credits / 100:.2f}, "
+                        f"Debits: {actual_debits / 100:.2f} vs {stated_debits / 100:.2f}"
+                    ),
                     severity="WARNING"
                 )
             
-            return ValidationResult(
-                validation_type="TRANSACTION_TOTALS",
-                is_valid=True
-            )
+            return SUCCESS_RESULTS["TRANSACTION_TOTALS"]
         except (ValueError, TypeError, KeyError) as e:
             return ValidationResult(
                 validation_type="TRANSACTION_TOTALS",
@@ -396,3 +388,19 @@ class FinancialValidator:
                 error_message=f"Error validating transactions: {str(e)}",
                 severity="WARNING"
             )
+
+
+# Rules applied per document type, in order
+INVOICE_RULES = (
+    FinancialValidator._validate_invoice_total,        # Total = Subtotal + Tax
+    FinancialValidator._validate_line_items_sum,       # Line items sum to subtotal
+    FinancialValidator._validate_tax_calculation,      # Tax = rate × subtotal
+    FinancialValidator._validate_required_fields,      # Required fields present
+    FinancialValidator._validate_dates,                # Date logic
+    FinancialValidator._validate_no_negative_amounts,  # Negative amounts
+)
+
+BANK_STATEMENT_RULES = (
+    FinancialValidator._validate_bank_balance,         # Closing = Opening + Credits - Debits
+    FinancialValidator._validate_transaction_totals,   # Transaction totals match
+)
@@ -0,0 +1,103 @@
+"""Document file storage: local disk, or S3-compatible object storage when configured."""
+
+import asyncio
+import os
+import tempfile
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import aioboto3
+from botocore.exceptions import ClientError
+
+from app.config import get_settings
+
+settings = get_settings()
+
+S3_SCHEME = "s3://"
+S3_KEY_PREFIX = "uploads/"
+
+# Presigned upload URLs are short-lived; clients request one right before uploading
+UPLOAD_URL_EXPIRY = 900
+
+_session = aioboto3.Session()
+
+
+def s3_enabled() -> bool:
+    """Whether documents are stored in S3 (or MinIO) instead of local disk."""
+    return bool(settings.s3_bucket)
+
+
+def is_s3_path(file_path: str) -> bool:
+    """Whether a stored document path points at object storage."""
+    return file_path.startswith(S3_SCHEME)
+
+
+def s3_path(key: str) -> str:
+    """Build the stored file path for an object key."""
+    return f"{S3_SCHEME}{settings.s3_bucket}/{key}"
+
+
+def _split_s3_path(file_path: str) -> tuple[str, str]:
+    bucket, _, key = file_path[len(S3_SCHEME):].partition("/")
+    return bucket, key
+
+
+def _client():
+    return _session.client(
+        "s3",
+        endpoint_url=settings.s3_endpoint_url,
+        region_name=settings.s3_region,
+    )
+
+
+async def generate_upload_url(key: str, content_type: Optional[str] = None) -> str:
+    """Create a presigned PUT URL so the client uploads straight to the bucket."""
+    params = {"Bucket": settings.s3_bucket, "Key": key}
+    if content_type:
+        params["ContentType"] = content_type
+    
+    async with _client() as s3:
+        return await s3.generate_presigned_url(
+            "put_object", Params=params, ExpiresIn=UPLOAD_URL_EXPIRY
+        )
+
+
+async def head_object(key: str) -> Optional[dict]:
+    """Return object metadata, or None if the object does not exist."""
+    async with _client() as s3:
+        try:
+            return await s3.head_object(Bucket=settings.s3_bucket, Key=key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+
+
+async def delete_file(file_path: str) -> None:
+    """Delete a stored document file."""
+    if is_s3_path(file_path):
+        bucket, key = _split_s3_path(file_path)
+        async with _client() as s3:
+            await s3.delete_object(Bucket=bucket, Key=key)
+    else:
+        await asyncio.to_thread(Path(file_path).unlink, missing_ok=True)
+
+
+@asynccontextmanager
+async def local_copy(file_path: str) -> AsyncIterator[str]:
+    """Yield a local path for a stored document, downloading it from S3 if needed."""
+    if not is_s3_path(file_path):
+        yield file_path
+        return
+    
+    bucket, key = _split_s3_path(file_path)
+    fd, tmp_name = tempfile.mkstemp(suffix=Path(key).suffix)
+    os.close(fd)
+    try:
+        async with _client() as s3:
+            await s3.download_file(bucket, key, tmp_name)
+        yield tmp_name
+    finally:
+        await asyncio.to_thread(Path(tmp_name).unlink, missing_ok=True)
+
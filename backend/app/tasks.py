@@ -0,0 +1,51 @@
+"""Celery tasks."""
+
+import asyncio
+import logging
+from typing import Optional
+from uuid import UUID
+
+import uvloop
+from celery.signals import worker_process_init
+
+from app.celery_app import celery_app
+
+logger = logging.getLogger(__name__)
+
+# One event loop per worker process, so pooled DB connections and the shared
+# processor's async HTTP clients stay bound to a loop that outlives each task.
+# uvloop (libuv) cuts the per-switch overhead of the pipeline's many awaits.
+_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = uvloop.new_event_loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+
+async def _process_document(document_id: UUID) -> bool:
+    """Run the processing pipeline on a fresh session."""
+    from app.database import AsyncSessionLocal
+    from app.services.processor import get_document_processor
+    
+    async with AsyncSessionLocal() as db:
+        return await get_document_processor().process_document(db, document_id)
+
+
+@worker_process_init.connect
+def init_worker_process(**kwargs):
+    """Build the shared processor once per worker process, before any task runs."""
+    from app.services.processor import get_document_processor
+    
+    _get_loop()
+    get_document_processor()
+
+
+@celery_app.task(name="app.tasks.process_document")
+def process_document(document_id: str) -> bool:
+    """Process an uploaded document in a worker process."""
+    logger.info(f"Worker picked up document {document_id}")
+    return _get_loop().run_until_complete(_process_document(UUID(document_id)))
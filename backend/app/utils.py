@@ -1,8 +1,13 @@
+from datetime import datetime, timezone
 from uuid import UUID
 from typing import Optional, Any
 from sqlalchemy.ext.asyncio import AsyncSession
+from app import audit_buffer
 from app.models import AuditLog
 
+# Owner of all documents and actions until authentication is wired in
+DEMO_USER_ID = UUID(int=1)
+
 async def log_audit(
     db: AsyncSession,
     action: str,
@@ -13,14 +18,20 @@ async def log_audit(
     description: Optional[str] = None,
     changes: Optional[dict[str, Any]] = None,
     ip_address: Optional[str] = None,
-    user_agent: Optional[str] = None
+    user_agent: Optional[str] = None,
+    transactional: bool = False
 ):
-    """Log an action to the audit trail."""
+    """
+    Log an action to the audit trail.
+    
+    Entries are buffered unless transactional is set or the action is in
+    audit_buffer.SYNC_ACTIONS, in which case they join the caller's transaction.
+    """
     # For demo, use the hardcoded user_id if none provided
     if not user_id:
-        user_id = UUID("00000000-0000-0000-0000-000000000001")
+        user_id = DEMO_USER_ID
         
-    audit_entry = AuditLog(
+    entry = dict(
         user_id=user_id,
         document_id=document_id,
         action=action,
@@ -31,6 +42,12 @@ async def log_audit(
         ip_address=ip_address,
         user_agent=user_agent
     )
-    db.add(audit_entry)
-    # We don't commit here to allow it to be part of the calling transaction if needed
-    # But for some routes we might need to commit explicitly
+    
+    # Buffered entries are queued once the caller commits and written in batches;
+    # without the writer (e.g. in Celery workers) they join the calling transaction
+    buffered = not transactional and action not in audit_buffer.SYNC_ACTIONS
+    if buffered and audit_buffer.is_running():
+        entry["created_at"] = datetime.now(timezone.utc)
+        audit_buffer.defer(db.sync_session, entry)
+    else:
+        db.add(AuditLog(**entry))